@@ -0,0 +1,67 @@
+"""
+This module contains :py:class:`CommandHandler`, which executes the commands
+received by :py:class:`~lftp.control.server.ControlServer`, and
+:py:func:`query`, which sends a command to a running control server.
+
+Commands are JSON objects with the command name under the ``name`` key and
+its keyword arguments under ``args``, e.g.::
+
+    {"name": "transfer_stats", "args": {"window": 600}}
+"""
+
+from __future__ import unicode_literals
+
+import json
+import socket
+
+from .server import ControlServer
+
+
+def transfer_stats(ftp_server, window=300):
+    """
+    Return statistics of the transfers which ended within the last `window`
+    seconds, or `None` if the transfer log is not enabled.
+    """
+    return ftp_server.transfer_stats(window)
+
+
+COMMANDS = {
+    'transfer_stats': transfer_stats,
+}
+
+
+class CommandHandler(object):
+    """
+    Callable to be passed to :py:class:`ControlServer` as `command_handler`,
+    which executes the commands over `ftp_server`.
+    """
+
+    def __init__(self, ftp_server):
+        self.ftp_server = ftp_server
+
+    def __call__(self, command):
+        name = command.get('name')
+        func = COMMANDS.get(name)
+        if func is None:
+            return dict(error='Unknown command {}'.format(name))
+        args = command.get('args', {})
+        try:
+            return dict(result=func(self.ftp_server, **args))
+        except TypeError as exc:
+            return dict(error='Invalid arguments: {}'.format(exc))
+
+
+def query(socket_path, name, **args):
+    """
+    Send command `name` with `args` to the control server listening at
+    `socket_path`, and return the decoded response.
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+        request = json.dumps(dict(name=name, args=args)) + '\0'
+        sock.sendall(request.encode('utf8'))
+        response = ControlServer.read_request(sock)
+    finally:
+        sock.close()
+    return ControlServer.parse_request(response)
@@ -17,8 +17,8 @@ from gevent.server import StreamServer
 
 
 class ControlServer(object):
-    def __init__(self, config, command_handler):
-        self.socket_path = config['app.socket']
+    def __init__(self, config, command_handler, socket_path=None):
+        self.socket_path = socket_path or config['app.socket']
         self.command_handler = command_handler
         self.server = None
 
@@ -73,16 +73,17 @@ class ControlServer(object):
     @staticmethod
     def read_request(sock, buff_size=2048, encoding='utf8'):
         data = buff = sock.recv(buff_size)
-        while buff and '\0' not in buff:
+        while buff and b'\0' not in buff:
             buff = sock.recv(buff_size)
             data += buff
         return data[:-1].decode(encoding)
 
     @staticmethod
-    def send_response(client_socket, response):
-        if not response[-1] == '\0':
-            response += '\0'
-        client_socket.sendall(response)
+    def send_response(client_socket, response, encoding='utf8'):
+        data = response.encode(encoding)
+        if not data.endswith(b'\0'):
+            data += b'\0'
+        client_socket.sendall(data)
 
     @staticmethod
     def parse_request(request_str):
@@ -20,4 +20,7 @@ class FTPDashboardPlugin(DashboardPlugin):
 
     def get_context(self):
         ftp_server = exts.ftp_server
-        return dict(status=ftp_server.status)
+        return dict(status=ftp_server.status,
+                    health=ftp_server.health_status,
+                    duplicates=ftp_server.duplicates_report,
+                    basepaths=ftp_server.get_basepaths())
@@ -10,6 +10,71 @@ import pbkdf2
 
 from pyftpdlib.authorizers import DummyAuthorizer, AuthenticationFailed
 
+from ..utils.string import to_unicode
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+
+_shared_values = {}
+
+
+def shared(value):
+    """
+    Return a single shared instance of each distinct `value`, so that the
+    values common to many users, such as home directories, permissions and
+    messages, are stored only once.
+    """
+    return _shared_values.setdefault(value, value)
+
+
+class _EmptyMapping(Mapping):
+    """
+    Read-only empty mapping shared by all users without permission overrides
+    """
+
+    def __getitem__(self, key):
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(())
+
+    def __len__(self):
+        return 0
+
+
+NO_OPERMS = _EmptyMapping()
+
+
+class UserRecord(object):
+    """
+    Compact entry of the virtual users table. It supports item access, so it
+    can be used in place of the dicts :py:class:`DummyAuthorizer` stores.
+    """
+    __slots__ = ('pwd', 'home', 'perm', 'operms', 'msg_login', 'msg_quit')
+
+    def __init__(self, pwd, home, perm, msg_login, msg_quit):
+        self.pwd = pwd
+        self.home = shared(home)
+        self.perm = shared(perm)
+        self.operms = NO_OPERMS
+        self.msg_login = shared(msg_login)
+        self.msg_quit = shared(msg_quit)
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self.__slots__
+
 
 class FTPAuthorizer(DummyAuthorizer):
 
@@ -38,18 +103,22 @@ class FTPAuthorizer(DummyAuthorizer):
         """
         if self.has_user(username):
             raise ValueError('user %r already exists' % username)
-        if not isinstance(homedir, unicode):
-            homedir = homedir.decode('utf8')
-        homedir = os.path.realpath(homedir)
-        user = {
-            'pwd': str(password),
-            'home': homedir,
-            'perm': perm,
-            'operms': {},
-            'msg_login': str(msg_login),
-            'msg_quit': str(msg_quit)
-        }
-        self.user_table[username] = user
+        homedir = os.path.realpath(to_unicode(homedir))
+        self.user_table[username] = UserRecord(pwd=str(password),
+                                               home=homedir,
+                                               perm=perm,
+                                               msg_login=str(msg_login),
+                                               msg_quit=str(msg_quit))
+
+    def override_perm(self, username, directory, perm, recursive=False):
+        """
+        Override permissions for a given directory.
+        """
+        user = self.user_table[username]
+        if user.operms is NO_OPERMS:
+            user.operms = {}
+        super(FTPAuthorizer, self).override_perm(username, directory, perm,
+                                                 recursive=recursive)
 
     def add_anonymous(self, homedir, **kwargs):
         """
@@ -0,0 +1,132 @@
+"""
+This module contains SharedPathCache, which caches virtual path resolution
+results in shared memory, so that they are reused by all worker processes of
+the FTP server.
+"""
+
+from __future__ import unicode_literals
+
+import os
+import mmap
+import time
+import zlib
+import struct
+import multiprocessing
+
+from ..utils.string import to_bytes
+
+
+# Cache header holding the current generation of the cache. Entries written
+# under an older generation are considered stale.
+HEADER = struct.Struct(str('<I'))
+# Slot layout: sequence number, generation, timestamp, basepath index (-1 for
+# paths which do not exist), key length, 10 fields of `os.stat_result`, key.
+# The integer stat fields are unsigned, as some network and FUSE filesystems
+# use inode numbers of 2**63 and above.
+SLOT = struct.Struct(str('<IIdhH7Q3d256s'))
+SEQUENCE = struct.Struct(str('<I'))
+MAX_KEY_LENGTH = 256
+MISSING = -1
+
+
+class SharedPathCache(object):
+    """
+    Fixed size hash table stored in an anonymous shared memory map, which maps
+    virtual paths to the index of the basepath the path was found under and
+    the :py:func:`os.stat` result of the path.
+
+    The memory map must be created before the worker processes are forked, so
+    that they all share the same mapping. Reads do not take any locks: each
+    slot carries a sequence number which is odd while the slot is being
+    written to, and reads which observe a changing sequence number are treated
+    as cache misses. Writes are serialized by a process shared lock.
+
+    Entries expire after `ttl` seconds, so changes made to the basepaths
+    outside of the FTP server are eventually picked up.
+    """
+
+    def __init__(self, slots=4096, ttl=5):
+        self.slots = slots
+        self.ttl = ttl
+        self._mm = mmap.mmap(-1, HEADER.size + slots * SLOT.size)
+        self._lock = multiprocessing.Lock()
+
+    @property
+    def generation(self):
+        return HEADER.unpack_from(self._mm, 0)[0]
+
+    def get(self, path):
+        """
+        Return a tuple of basepath index and :py:class:`os.stat_result` for
+        `path`, or `None` if `path` is not cached. The index is
+        :py:data:`MISSING` if `path` was not found under any basepath.
+        """
+        key = to_bytes(path)
+        offset = self._offset(key)
+        seq = SEQUENCE.unpack_from(self._mm, offset)[0]
+        if seq & 1:
+            return None
+        record = SLOT.unpack_from(self._mm, offset)
+        if SEQUENCE.unpack_from(self._mm, offset)[0] != seq:
+            return None
+        (_, generation, cached_at, index, keylen), rest = (record[:5],
+                                                           record[5:])
+        if generation != self.generation or rest[-1][:keylen] != key:
+            return None
+        if time.time() - cached_at > self.ttl:
+            return None
+        if index == MISSING:
+            return index, None
+        return index, os.stat_result(rest[:-1])
+
+    def set(self, path, index, st=None):
+        """
+        Store the basepath `index` and :py:class:`os.stat_result` `st` for
+        `path`. Results which do not fit in a slot are not stored.
+        """
+        key = to_bytes(path)
+        if len(key) > MAX_KEY_LENGTH:
+            return
+        if st is None:
+            fields = (0,) * 10
+        else:
+            fields = tuple(st[:7]) + (st.st_atime, st.st_mtime, st.st_ctime)
+        try:
+            self._write(self._offset(key), self.generation, time.time(),
+                        index, len(key), fields, key)
+        except struct.error:
+            pass
+
+    def invalidate(self, path=None):
+        """
+        Remove `path` from the cache. If `path` is omitted, the whole cache
+        is invalidated.
+        """
+        if path is None:
+            with self._lock:
+                HEADER.pack_into(self._mm, 0, (self.generation + 1) % 2 ** 32)
+            return
+        key = to_bytes(path)
+        offset = self._offset(key)
+        record = SLOT.unpack_from(self._mm, offset)
+        if record[-1][:record[4]] == key:
+            self._write(offset, 0, 0, MISSING, 0, (0,) * 10, b'')
+
+    def _write(self, offset, generation, cached_at, index, keylen, fields,
+               key):
+        # stat fields are packed as 7 integers and 3 floats, before the slot
+        # is touched, so values which do not fit leave it intact
+        values = (tuple(int(v) for v in fields[:7]) +
+                  tuple(float(v) for v in fields[7:]))
+        record = SLOT.pack(0, generation, cached_at, index, keylen,
+                           *(values + (key,)))[SEQUENCE.size:]
+        with self._lock:
+            seq = SEQUENCE.unpack_from(self._mm, offset)[0] + 1
+            SEQUENCE.pack_into(self._mm, offset, seq)
+            start = offset + SEQUENCE.size
+            self._mm[start:start + len(record)] = record
+            SEQUENCE.pack_into(self._mm, offset, (seq + 1) % 2 ** 32)
+
+    def _offset(self, key):
+        slot = (zlib.crc32(key) & 0xffffffff) % self.slots
+        return HEADER.size + slot * SLOT.size
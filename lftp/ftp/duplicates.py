@@ -0,0 +1,246 @@
+"""
+This module contains DuplicateIndex and DuplicateScanner, which detect files
+present under the same virtual path on multiple basepaths and decide which
+of the copies should be served.
+"""
+
+from __future__ import unicode_literals
+
+import os
+import time
+import hashlib
+import logging
+import threading
+
+from stat import S_ISDIR
+from collections import namedtuple
+
+from .upload import is_part
+
+
+NEWEST = 'newest'
+FASTEST = 'fastest'
+POLICIES = (NEWEST, FASTEST)
+
+# Number of bytes read from the beginning, the middle and the end of a file to
+# compute its fingerprint
+SAMPLE_SIZE = 64 * 1024
+
+
+Copy = namedtuple('Copy', ('index', 'size', 'mtime', 'digest'))
+
+
+class Collision(object):
+    """
+    Virtual path `path` found on multiple basepaths, with one :py:class:`Copy`
+    for each basepath in `copies`.
+    """
+    __slots__ = ('path', 'copies', 'identical', 'preferred')
+
+    def __init__(self, path, copies, preferred):
+        self.path = path
+        self.copies = copies
+        self.identical = same_content(copies)
+        self.preferred = preferred
+
+
+def same_content(copies):
+    """ Returns `True` if all `copies` have matching fingerprints """
+    digests = set(c.digest for c in copies)
+    return (len(set(c.size for c in copies)) == 1 and
+            len(digests) == 1 and None not in digests)
+
+
+def sample_digest(path, size):
+    """
+    Return a hex digest computed from the size and up to three samples of the
+    file at `path`, taken from its beginning, middle and end.
+    """
+    checksum = hashlib.sha1(str(size).encode('ascii'))
+    offsets = sorted(set([0,
+                          max(0, size // 2 - SAMPLE_SIZE // 2),
+                          max(0, size - SAMPLE_SIZE)]))
+    with open(path, 'rb') as f:
+        for offset in offsets:
+            f.seek(offset)
+            checksum.update(f.read(SAMPLE_SIZE))
+    return checksum.hexdigest()
+
+
+class DuplicateIndex(object):
+    """
+    Stores the collisions found by :py:class:`DuplicateScanner` and the
+    measured read speed of each basepath, and tells which copy of a colliding
+    path should be served according to `policy`.
+
+    With the :py:data:`NEWEST` policy the most recently modified copy is
+    served. With the :py:data:`FASTEST` policy identical copies are served
+    from the basepath with the highest measured read speed, while copies that
+    differ are still resolved to the newest one.
+    """
+
+    def __init__(self, policy=NEWEST):
+        if policy not in POLICIES:
+            raise ValueError('unknown duplicates policy {}'.format(policy))
+        self.policy = policy
+        self.collisions = {}
+        self.read_speed = {}
+        self.last_scan = None
+
+    def preferred(self, path):
+        """
+        Return the index of the basepath whose copy of virtual `path` should
+        be served, or `None` if `path` is not a known collision.
+        """
+        collision = self.collisions.get(path)
+        if collision is None:
+            return None
+        return collision.preferred
+
+    def choose(self, copies):
+        newest = max(copies, key=lambda c: c.mtime)
+        if self.policy == FASTEST and same_content(copies):
+            return max(copies,
+                       key=lambda c: self.read_speed.get(c.index, 0)).index
+        return newest.index
+
+    def record_read(self, index, size, elapsed):
+        """ Update the read speed estimate of basepath at `index` """
+        if elapsed <= 0:
+            return
+        speed = size / elapsed
+        previous = self.read_speed.get(index)
+        if previous is not None:
+            # exponential moving average, so a single slow read caused by
+            # something else going on does not flip the preference
+            speed = 0.8 * previous + 0.2 * speed
+        self.read_speed[index] = speed
+
+    def report(self):
+        """
+        Return a dict summarizing the collisions, suitable for presentation.
+        """
+        collisions = list(self.collisions.values())
+        differing = sorted((c for c in collisions if not c.identical),
+                           key=lambda c: c.path)
+        return dict(total=len(collisions),
+                    differing=differing,
+                    last_scan=self.last_scan)
+
+
+class DuplicateScanner(threading.Thread):
+    """
+    Background thread which walks the union of `basepaths` every `interval`
+    seconds, fingerprints the files present on more than one basepath and
+    stores the results in `index`. The blacklisted paths are skipped using
+    `is_blacklisted`, a callable taking a virtual path. If `health` is set,
+    the filesystem operations go through it, so that basepaths which do not
+    respond are skipped.
+    """
+
+    def __init__(self, basepaths, index, interval=3600, is_blacklisted=None,
+                 health=None):
+        super(DuplicateScanner, self).__init__()
+        self.daemon = True
+        self.basepaths = basepaths
+        self.index = index
+        self.interval = interval
+        self.is_blacklisted = is_blacklisted or (lambda path: False)
+        self.health = health
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.scan()
+            except Exception:
+                logging.exception('Error while scanning for duplicates')
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+
+    def scan(self):
+        """
+        Walk the union of the basepaths and replace the collisions stored in
+        the index with the ones found.
+        """
+        collisions = {}
+        pending = ['']
+        while pending and not self._stop_event.is_set():
+            virtual_dir = pending.pop()
+            entries = {}
+            for index in range(len(self.basepaths)):
+                for name, st in self.list_entries(index, virtual_dir):
+                    entries.setdefault(name, []).append((index, st))
+            for name, found in entries.items():
+                path = os.path.join(virtual_dir, name)
+                if self.is_blacklisted(path):
+                    continue
+                if any(S_ISDIR(st.st_mode) for _, st in found):
+                    pending.append(path)
+                    continue
+                if len(found) > 1:
+                    collisions[path] = self.fingerprint(path, found)
+        if self._stop_event.is_set():
+            return
+        self.index.collisions = collisions
+        self.index.last_scan = time.time()
+        logging.debug('Duplicate scan found {} collisions'.format(
+            len(collisions)))
+
+    def list_entries(self, index, virtual_dir):
+        full_dir = os.path.join(self.basepaths[index], virtual_dir)
+        try:
+            names = self.call(index, os.listdir, full_dir)
+        except OSError:
+            return
+        for name in names:
+            if is_part(name):
+                continue
+            try:
+                yield name, self.call(index, os.stat,
+                                      os.path.join(full_dir, name))
+            except OSError:
+                continue
+
+    def call(self, index, func, *args):
+        """
+        Call `func` with `args` for basepath at `index`, through
+        :py:attr:`health` if configured.
+        """
+        if self.health is None:
+            return func(*args)
+        return self.health.run(index, func, *args)
+
+    def fingerprint(self, path, found):
+        """
+        Return a :py:class:`Collision` for the copies of virtual `path`.
+        Copies are compared by size and modification time first and sampled
+        hashes are computed only if all the copies have the same size. Hashes
+        from the previous scan are reused for copies which did not change.
+        """
+        previous = self.index.collisions.get(path)
+        known = dict((c.index, c) for c in previous.copies) if previous else {}
+        same_size = len(set(st.st_size for _, st in found)) == 1
+        copies = []
+        for index, st in found:
+            digest = None
+            copy = known.get(index)
+            if (copy is not None and copy.digest is not None and
+                    copy.size == st.st_size and copy.mtime == st.st_mtime):
+                digest = copy.digest
+            elif same_size:
+                full_path = os.path.join(self.basepaths[index], path)
+                start = time.time()
+                try:
+                    digest = self.call(index, sample_digest, full_path,
+                                       st.st_size)
+                except (IOError, OSError):
+                    pass
+                else:
+                    self.index.record_read(index,
+                                           min(st.st_size, 3 * SAMPLE_SIZE),
+                                           time.time() - start)
+            copies.append(Copy(index, st.st_size, st.st_mtime, digest))
+        return Collision(path, copies, self.index.choose(copies))
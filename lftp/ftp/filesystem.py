@@ -9,11 +9,31 @@ import os
 import re
 import errno
 
+from stat import S_ISDIR, S_ISREG
 from functools import wraps
+from itertools import chain, islice
 
 from pyftpdlib.filesystems import AbstractedFS, FilesystemError
 
 from ..utils.string import to_unicode
+from .health import raise_timeout_error
+from .upload import PartialUpload, part_path, open_part, is_part, fsync_dir
+
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+
+# Number of directory entries read at once by
+# :py:meth:`UnifiedFilesystem.iterdir`
+READ_CHUNK = 256
+# Number of bytes copied at once by :py:meth:`UnifiedFilesystem.open` when
+# resuming over a complete file
+COPY_CHUNK = 1024 * 1024
 
 
 def normpaths(*paths):
@@ -21,6 +41,27 @@ def normpaths(*paths):
     return os.path.normpath(os.path.join(*paths))
 
 
+def is_under(path, basepath):
+    """ Returns `True` if absolute `path` is `basepath` or located under it """
+    basepath = basepath.rstrip(os.sep)
+    return path == basepath or path.startswith(basepath + os.sep)
+
+
+def iter_names(path):
+    """
+    Iterate over the names of the entries in directory `path`, reading the
+    directory lazily if :py:func:`scandir` is available.
+    """
+    if scandir is None:
+        return iter(os.listdir(path))
+    return (entry.name for entry in scandir(path))
+
+
+def read_chunk(iterator, size):
+    """ Return a list of the next `size` items of `iterator` """
+    return list(islice(iterator, size))
+
+
 def raise_path_error(path):
     raise OSError(errno.ENOENT, 'No such file or directory {}'.format(path), path)
 
@@ -37,16 +78,59 @@ class UnifiedFilesystem(AbstractedFS):
     """
     VIRTUAL_ROOT = '.'
 
-    basepaths = []
+    # The configuration is stored in class attributes, so that it is shared
+    # by all instances instead of being copied into each session. Use
+    # :py:meth:`configure` to set it.
+    basepaths = ()
     on_modified = []
 
     blacklist = None
-
-    def __init__(self, *args, **kwargs):
-        super(UnifiedFilesystem, self).__init__(*args, **kwargs)
-        if self.blacklist:
-            self._blacklist_rx = [
-                re.compile(patt, re.IGNORECASE) for patt in self.blacklist]
+    _blacklist_rx = ()
+
+    # Optional :py:class:`~lftp.ftp.cache.SharedPathCache` instance shared by
+    # all worker processes
+    cache = None
+
+    # Optional :py:class:`~lftp.ftp.health.BasepathHealth` instance which
+    # guards the operations on the basepaths against unresponsive mounts
+    health = None
+
+    # Optional :py:class:`~lftp.ftp.duplicates.DuplicateIndex` instance which
+    # decides which copy of paths present on multiple basepaths is served
+    duplicates = None
+
+    # Flush upload data to disk every `fsync_bytes` bytes (0 disables periodic
+    # flushing), and before an upload is published if `fsync_on_publish` is set
+    fsync_bytes = 0
+    fsync_on_publish = True
+
+    # Listings returned by :py:meth:`iterdir` are sorted only if they have no
+    # more than `sort_limit` entries
+    sort_limit = 1000
+
+    # Maps full paths of uploads in progress to their virtual paths. The dict
+    # is created on the first upload of the session.
+    _uploads = None
+
+    @classmethod
+    def configure(cls, basepaths, blacklist=None, cache=None, health=None,
+                  duplicates=None, fsync_bytes=0, fsync_on_publish=True,
+                  sort_limit=1000):
+        """
+        Set the configuration shared by all instances. The blacklist patterns
+        are compiled here once, so this should be called before the worker
+        processes are forked.
+        """
+        cls.basepaths = tuple(basepaths)
+        cls.blacklist = tuple(blacklist or ())
+        cls._blacklist_rx = tuple(re.compile(patt, re.IGNORECASE)
+                                  for patt in cls.blacklist)
+        cls.cache = cache
+        cls.health = health
+        cls.duplicates = duplicates
+        cls.fsync_bytes = fsync_bytes
+        cls.fsync_on_publish = fsync_on_publish
+        cls.sort_limit = sort_limit
 
     def modifier(func):
         """
@@ -56,8 +140,7 @@ class UnifiedFilesystem(AbstractedFS):
         @wraps(func)
         def wrapper(self, path, *args, **kwargs):
             result = func(self, path, *args, **kwargs)
-            for cb in self.on_modified:
-                cb(path)
+            self.notify_modified(path)
             return result
         return wrapper
 
@@ -77,15 +160,35 @@ class UnifiedFilesystem(AbstractedFS):
         """
         This decorator provides a handy way to call stdlib function `stdlib_func`
         which accepts one path argument. If `exception` is set to `True`, an
-        :py:exc:`OSError` will be raised if the path does not exist.
+        :py:exc:`OSError` will be raised if the path does not exist, or if its
+        basepath does not respond. Otherwise `stdlib_func` is treated as a
+        predicate, which is `False` in these cases.
+        """
+        def decorator(func):
+            @wraps(func)
+            def wrapper(self, path, *args, **kwargs):
+                index, full_path, _ = self.resolve(path)
+                if full_path is not None:
+                    if exception:
+                        return self.call(index, stdlib_func, full_path)
+                    return self.check(index, stdlib_func, full_path)
+                if exception:
+                    raise_path_error(path)
+            return wrapper
+        return decorator
+
+    def stat_wrapper(stat_func, exception=True):
+        """
+        This decorator works like :py:func:`stdlib_wrapper`, but instead of
+        calling a stdlib function, it calls `stat_func` with the (possibly
+        cached) :py:func:`os.stat` result of the path.
         """
         def decorator(func):
             @wraps(func)
             def wrapper(self, path, *args, **kwargs):
-                for basepath in self.basepaths:
-                    full_path = normpaths(basepath, path)
-                    if os.path.exists(full_path):
-                        return stdlib_func(full_path)
+                _, full_path, st = self.resolve(path)
+                if full_path is not None:
+                    return stat_func(st)
                 if exception:
                     raise_path_error(path)
             return wrapper
@@ -102,32 +205,136 @@ class UnifiedFilesystem(AbstractedFS):
         Paths which escape out of :py:attr:`basepaths` are considered to be
         invalid.
         """
-        for basepath in self.basepaths:
-            fullpath = os.path.realpath(normpaths(basepath, path))
+        for index, basepath in self.available_basepaths():
+            try:
+                fullpath = self.call(index, os.path.realpath,
+                                     normpaths(basepath, path))
+                if not basepath.endswith(os.sep):
+                    basepath += os.sep
+                basepath = self.call(index, os.path.realpath, basepath)
+            except OSError:
+                continue
             if not fullpath.endswith(os.sep):
                 fullpath += os.sep
-            if not basepath.endswith(os.sep):
-                basepath += os.sep
-            basepath = os.path.realpath(basepath)
             if fullpath[0:len(basepath)] == basepath:
                 return True
         return False
 
     @virtualize_path
-    @modifier
     def open(self, path, mode):
         """
         Wrapper for `open`, which resolves `path` by extracting the virtual
         path and generating the actual path.
-        """
-        for basepath in self.basepaths:
-            fullpath = normpaths(basepath, path)
-            if os.path.isfile(fullpath):
-                return open(fullpath, mode)
-        # in case of write operations where a new file should be created, just
-        # use the last basepath from the list
-        fullpath = normpaths(self.basepaths[-1], path)
-        return open(fullpath, mode)
+
+        Files opened for writing are not written in place. The data goes to a
+        hidden temporary file next to the target path, which is moved into
+        place by :py:meth:`publish_upload` once the transfer is complete. An
+        existing temporary file left behind by an interrupted transfer is
+        reused when the upload is resumed (REST or APPE). Resuming an upload
+        which is still in progress in another session fails with ``EBUSY``,
+        while a new upload of the same path gets its own temporary file.
+
+        Appending to, or resuming over a complete file copies the file into
+        the temporary file first. The copy is made by the session before the
+        transfer starts, so the client waits for as long as reading and
+        writing the whole file takes.
+        """
+        index, fullpath = self.find_file(path)
+        if not any(m in mode for m in 'wa+'):
+            if fullpath is None:
+                raise_path_error(path)
+            return self.call(index, open, fullpath, mode)
+        if fullpath is None:
+            index, fullpath = self.get_target(path)
+        partpath = part_path(fullpath)
+        copy = False
+        if 'w' not in mode and not self.check(index, os.path.exists, partpath):
+            if self.check(index, os.path.isfile, fullpath):
+                # appending to or resuming over a complete file, which has to
+                # stay intact until the new version is published
+                copy = True
+            elif 'a' not in mode:
+                raise_path_error(path)
+        try:
+            f = self.call(index, open_part, partpath, mode, copy)
+        except OSError as exc:
+            if exc.errno != errno.EBUSY or 'w' not in mode:
+                raise
+            # the same path is being uploaded in another session
+            partpath = part_path(fullpath, unique=True)
+            f = self.call(index, open_part, partpath, mode)
+        if copy:
+            try:
+                self._copy_file(index, fullpath, f)
+            except Exception:
+                f.close()
+                raise
+        fileobj = PartialUpload(f,
+                                fullpath,
+                                partpath,
+                                fsync_bytes=self.fsync_bytes,
+                                fsync_on_close=self.fsync_on_publish)
+        if self._uploads is None:
+            self._uploads = {}
+        self._uploads[fullpath] = (path, index)
+        return fileobj
+
+    def publish_upload(self, fileobj):
+        """
+        Atomically move the temporary file of completed upload `fileobj` to
+        its final path, close it and notify the registered callbacks about
+        it. The file is closed only once it is in place, so that its lock
+        keeps other uploads of the same path from reusing it until then.
+        """
+        upload = self._uploads and self._uploads.pop(fileobj.name, None)
+        if not upload:
+            fileobj.close()
+            return
+        path, index = upload
+        published = False
+        try:
+            if self.fsync_on_publish:
+                self.call(index, fileobj.fsync)
+            self.call(index, os.rename, fileobj.part_path, fileobj.name)
+            published = True
+        finally:
+            try:
+                self.call(index, fileobj.close)
+            except OSError:
+                # do not mask the error the upload failed with
+                if published:
+                    raise
+        if self.fsync_on_publish:
+            try:
+                self.call(index, fsync_dir, fileobj.name)
+            except OSError:
+                # the upload is in place already
+                pass
+        self.notify_modified(path)
+
+    def _copy_file(self, index, path, dest):
+        """
+        Copy the file at `path` on basepath at `index` into file object
+        `dest`, reading and writing it in chunks of :py:data:`COPY_CHUNK`
+        bytes, each of which is subject to the timeout of the basepath.
+        """
+        source = self.call(index, open, path, 'rb')
+        try:
+            while True:
+                data = self.call(index, source.read, COPY_CHUNK)
+                if not data:
+                    break
+                self.call(index, dest.write, data)
+        finally:
+            source.close()
+
+    def abandon_upload(self, fullpath):
+        """
+        Forget about the incomplete upload to `fullpath`. The temporary file
+        is kept so the client can resume the transfer later.
+        """
+        if self._uploads:
+            self._uploads.pop(fullpath, None)
 
     @virtualize_path
     def chdir(self, path):
@@ -135,10 +342,12 @@ class UnifiedFilesystem(AbstractedFS):
         Change the current directory for the user, extracting the virtual path
         and moving to the actual path.
         """
-        for basepath in self.basepaths:
+        for index, basepath in self.available_basepaths():
             fullpath = normpaths(basepath, path)
-            if os.path.isdir(fullpath) and not self.is_blacklisted(path):
-                super(UnifiedFilesystem, self).chdir(fullpath)
+            if (self.check(index, os.path.isdir, fullpath) and
+                    not self.is_blacklisted(path)):
+                self.call(index, super(UnifiedFilesystem, self).chdir,
+                          fullpath)
                 return
         raise_path_error(path)
 
@@ -154,12 +363,16 @@ class UnifiedFilesystem(AbstractedFS):
         virtual_path = self.get_virtual_path(path)
         listing = []
         exists = False
-        for basepath in self.basepaths:
+        for index, basepath in self.available_basepaths():
             full_path = normpaths(basepath, virtual_path)
-            if os.path.exists(full_path):
+            if self.check(index, os.path.exists, full_path):
                 exists = True
+                try:
+                    names = self.call(index, os.listdir, full_path)
+                except OSError:
+                    continue
                 # Filter out blacklisted entries from directory listing
-                entries = [p for p in os.listdir(full_path)
+                entries = [p for p in names
                            if not self.is_blacklisted(os.path.join(virtual_path, p))]
                 listing.extend(entries)
         # The :py:attr:`basepaths` directories should not raise an exception
@@ -170,8 +383,62 @@ class UnifiedFilesystem(AbstractedFS):
         listing = list(set(listing))
         return listing
 
+    def iterdir(self, path):
+        """
+        Returns an iterator over the entries present at ``path``, like
+        :py:meth:`listdir`, except that the directories are read lazily while
+        the iterator is consumed, so the first entries are available without
+        reading all of them.
+
+        Listings with no more than :py:attr:`sort_limit` entries are sorted,
+        larger ones are returned in the order they are read in.
+        """
+        virtual_path = self.get_virtual_path(path)
+        full_paths = [(index, normpaths(basepath, virtual_path))
+                      for index, basepath in self.available_basepaths()
+                      if self.check(index, os.path.exists,
+                                    normpaths(basepath, virtual_path))]
+        # The :py:attr:`basepaths` directories should not raise an exception
+        if virtual_path != self.VIRTUAL_ROOT and not full_paths:
+            raise_path_error(path)
+        entries = self._iter_entries(virtual_path, full_paths)
+        head = list(islice(entries, self.sort_limit + 1))
+        if len(head) <= self.sort_limit:
+            head.sort()
+            return iter(head)
+        return chain(head, entries)
+
+    def _iter_entries(self, virtual_path, full_paths):
+        seen = set()
+        for index, full_path in full_paths:
+            for name in self._read_names(index, full_path):
+                if name in seen:
+                    continue
+                seen.add(name)
+                # Filter out blacklisted entries from directory listing
+                if not self.is_blacklisted(os.path.join(virtual_path, name)):
+                    yield name
+
+    def _read_names(self, index, full_path):
+        # The directory is read in chunks through :py:meth:`call`, so that a
+        # basepath which stops responding while it is being read ends the
+        # listing instead of blocking it
+        try:
+            names = self.call(index, iter_names, full_path)
+        except OSError:
+            return
+        while True:
+            try:
+                chunk = self.call(index, read_chunk, names, READ_CHUNK)
+            except OSError:
+                return
+            if not chunk:
+                return
+            for name in chunk:
+                yield name
+
     @virtualize_path
-    @stdlib_wrapper(os.stat)
+    @stat_wrapper(lambda st: st)
     def stat(self, path):
         """
         Wrapper for :py:func:`os.stat`, which resolves `path` by extracting the
@@ -180,13 +447,32 @@ class UnifiedFilesystem(AbstractedFS):
         pass
 
     @virtualize_path
-    @stdlib_wrapper(os.lstat)
     def lstat(self, path):
         """
         Wrapper for :py:func:`os.lstat`, which resolves `path` by extracting
         the virtual path and generating the actual path.
-        """
-        pass
+
+        As it is called for each entry of a directory listing, the path is
+        looked up with a single :py:func:`os.lstat` call per basepath, and
+        the results are not stored in :py:attr:`cache`.
+        """
+        key = os.path.normpath(path)
+        basepaths = self.lookup_order(key)
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None and cached[1] is not None:
+                # try the basepath the path was last resolved to first
+                basepaths.sort(key=lambda item: item[0] != cached[0])
+        timeout_error = None
+        for index, basepath in basepaths:
+            try:
+                return self.call(index, os.lstat, normpaths(basepath, path))
+            except OSError as exc:
+                if exc.errno == errno.ETIMEDOUT:
+                    timeout_error = exc
+        if timeout_error is not None:
+            raise timeout_error
+        raise_path_error(path)
 
     @virtualize_path
     @stdlib_wrapper(os.readlink)
@@ -198,7 +484,7 @@ class UnifiedFilesystem(AbstractedFS):
         pass
 
     @virtualize_path
-    @stdlib_wrapper(os.path.isfile, exception=False)
+    @stat_wrapper(lambda st: S_ISREG(st.st_mode), exception=False)
     def isfile(self, path):
         """
         Wrapper for :py:func:`os.path.isfile`, which resolves `path` by
@@ -226,7 +512,7 @@ class UnifiedFilesystem(AbstractedFS):
             return self._isdir(path)
 
     @virtualize_path
-    @stdlib_wrapper(os.path.isdir, exception=False)
+    @stat_wrapper(lambda st: S_ISDIR(st.st_mode), exception=False)
     def _isdir(self, path):
         """
         Wrapper for :py:func:`os.path.isdir`, which resolves `path` by
@@ -235,16 +521,38 @@ class UnifiedFilesystem(AbstractedFS):
         pass
 
     @virtualize_path
-    @stdlib_wrapper(os.path.getsize)
     def getsize(self, path):
         """
         Wrapper for :py:func:`os.path.getsize`, which resolves `path` by
         extracting the virtual path and generating the actual path.
+
+        If there is an interrupted upload of `path`, the size of its temporary
+        file is returned instead, as that is where a resumed upload continues
+        from, see :py:meth:`get_upload_size`.
         """
-        pass
+        size = self.get_upload_size(path)
+        if size is not None:
+            return size
+        _, full_path, st = self.resolve(path)
+        if full_path is None:
+            raise_path_error(path)
+        return st.st_size
+
+    @virtualize_path
+    def get_upload_size(self, path):
+        """
+        Returns the size of the temporary file of an interrupted upload of
+        `path`, so clients can work out the offset from which to resume it,
+        or `None` if there is no such upload.
+        """
+        for index, basepath in self.available_basepaths():
+            full_path = part_path(normpaths(basepath, path))
+            if self.check(index, os.path.exists, full_path):
+                return self.call(index, os.path.getsize, full_path)
+        return None
 
     @virtualize_path
-    @stdlib_wrapper(os.path.getmtime)
+    @stat_wrapper(lambda st: st.st_mtime)
     def getmtime(self, path):
         """
         Wrapper for :py:func:`os.path.getmtime`, which resolves `path` by
@@ -257,11 +565,11 @@ class UnifiedFilesystem(AbstractedFS):
     def mkdir(self, path):
         """
         Wrapper for `os.mkdir`. The generated path from the virtual path will
-        be based on the last basepath from the list as there is no way to
-        predict which one should be used.
+        be based on the basepath chosen by :py:meth:`get_target` as there is
+        no way to predict which one should be used.
         """
-        fullpath = normpaths(self.basepaths[-1], path)
-        return os.mkdir(fullpath)
+        index, fullpath = self.get_target(path)
+        return self.call(index, os.mkdir, fullpath)
 
     @virtualize_path
     @modifier
@@ -290,17 +598,168 @@ class UnifiedFilesystem(AbstractedFS):
         """
         virtual_src = self.get_virtual_path(src)
         virtual_dst = self.get_virtual_path(dst)
-        for basepath in self.basepaths:
+        for index, basepath in self.available_basepaths():
             abs_src = normpaths(basepath, virtual_src)
-            if os.path.exists(abs_src) and not self.is_blacklisted(abs_src):
+            if (self.check(index, os.path.exists, abs_src) and
+                    not self.is_blacklisted(abs_src)):
                 abs_dst = normpaths(basepath, virtual_dst)
-                os.rename(abs_src, abs_dst)
-                for cb in self.on_modified:
-                    cb(virtual_src)
-                    cb(virtual_dst)
+                self.call(index, os.rename, abs_src, abs_dst)
+                if self.cache is not None:
+                    # renaming a directory affects all the paths beneath it
+                    self.cache.invalidate()
+                self.notify_modified(virtual_src, virtual_dst)
                 return
         raise_path_error(src)
 
+    def resolve(self, path):
+        """
+        Returns a tuple of the index of the basepath, the full path and
+        :py:func:`os.stat` result of the virtual `path` under the first of the
+        :py:attr:`basepaths` where it exists, or a tuple of `None` values if
+        it does not exist anywhere.
+
+        If the path is present on multiple basepaths and :py:attr:`duplicates`
+        is configured, the basepath of the copy it prefers is tried first.
+
+        Results are stored in :py:attr:`cache` if one is configured, unless
+        some of the basepaths were skipped because they are not responding.
+        """
+        key = os.path.normpath(path)
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                index, st = cached
+                if st is None:
+                    return None, None, None
+                if self.health is None or self.health.available(index):
+                    return index, normpaths(self.basepaths[index], path), st
+        basepaths = self.lookup_order(key)
+        cache = self.cache
+        if len(basepaths) < len(self.basepaths):
+            cache = None
+        for index, basepath in basepaths:
+            full_path = normpaths(basepath, path)
+            try:
+                st = self.call(index, os.stat, full_path)
+            except OSError as exc:
+                if exc.errno == errno.ETIMEDOUT:
+                    cache = None
+                continue
+            if cache is not None:
+                cache.set(key, index, st)
+            return index, full_path, st
+        if cache is not None:
+            cache.set(key, -1)
+        return None, None, None
+
+    def lookup_order(self, path):
+        """
+        Returns the list of `(index, basepath)` tuples of the available
+        basepaths in the order in which virtual `path` is looked up, i.e. the
+        basepath of the copy preferred by :py:attr:`duplicates` first.
+        """
+        basepaths = self.available_basepaths()
+        if self.duplicates is not None:
+            preferred = self.duplicates.preferred(path)
+            if preferred is not None:
+                basepaths.sort(key=lambda item: item[0] != preferred)
+        return basepaths
+
+    def find_file(self, path):
+        """
+        Returns a tuple of the index of the basepath and the full path of the
+        regular file found at virtual `path`, or a tuple of `None` values if
+        there is no such file.
+        """
+        index, full_path, st = self.resolve(path)
+        if full_path is None:
+            return None, None
+        if S_ISREG(st.st_mode):
+            return index, full_path
+        # the first match is not a file, but one of the others may be
+        for index, basepath in self.available_basepaths():
+            candidate = normpaths(basepath, path)
+            if self.check(index, os.path.isfile, candidate):
+                return index, candidate
+        return None, None
+
+    def get_target(self, path):
+        """
+        Returns a tuple of the index of the basepath and the full path at
+        which a new file or directory is created for virtual `path`. The last
+        of the basepaths not taken out of use by :py:attr:`health` is used.
+        """
+        basepaths = self.available_basepaths()
+        if not basepaths:
+            raise_timeout_error(path)
+        index, basepath = basepaths[-1]
+        return index, normpaths(basepath, path)
+
+    def available_basepaths(self):
+        """
+        Returns a list of `(index, basepath)` tuples of the
+        :py:attr:`basepaths` which are not taken out of use by
+        :py:attr:`health`.
+        """
+        basepaths = list(enumerate(self.basepaths))
+        if self.health is None:
+            return basepaths
+        return [(index, basepath) for index, basepath in basepaths
+                if self.health.available(index)]
+
+    def call(self, index, func, *args):
+        """
+        Call `func` with `args` for basepath at `index`, through
+        :py:attr:`health` if configured. :py:exc:`OSError` is raised if the
+        basepath does not respond.
+        """
+        if self.health is None:
+            return func(*args)
+        return self.health.run(index, func, *args)
+
+    def check(self, index, func, path):
+        """
+        Call predicate `func`, such as :py:func:`os.path.exists`, with `path`
+        for basepath at `index`. Returns `False` if the basepath does not
+        respond.
+        """
+        try:
+            return self.call(index, func, path)
+        except OSError:
+            return False
+
+    @classmethod
+    def invalidate_cached(cls, path=None):
+        """
+        Drop the cached resolution results of virtual `path`, which was
+        modified outside of the FTP server, and of its parent directory. The
+        whole cache is dropped if `path` is omitted, or if it is not cached as
+        a regular file, as the paths beneath it may be affected too.
+        """
+        if cls.cache is None:
+            return
+        key = path and os.path.normpath(path)
+        cached = key and cls.cache.get(key)
+        if not cached or cached[1] is None or not S_ISREG(cached[1].st_mode):
+            cls.cache.invalidate()
+            return
+        cls.cache.invalidate(key)
+        cls.cache.invalidate(os.path.dirname(key) or cls.VIRTUAL_ROOT)
+
+    def notify_modified(self, *paths):
+        """
+        Drop the cached resolution results of the modified virtual `paths` and
+        their parent directories, and execute the registered callbacks.
+        """
+        for path in paths:
+            if self.cache is not None:
+                key = os.path.normpath(path)
+                self.cache.invalidate(key)
+                self.cache.invalidate(os.path.dirname(key) or
+                                      self.VIRTUAL_ROOT)
+            for cb in self.on_modified:
+                cb(path)
+
     def chmod(self, path, mode):
         raise FilesystemError('Unsupported operation')
 
@@ -318,20 +777,36 @@ class UnifiedFilesystem(AbstractedFS):
             return path
         # Return path relative to one of the basepaths
         for basepath in self.basepaths:
-            if os.path.commonprefix([path, basepath]) == basepath:
+            if is_under(path, basepath):
                 # Get the rest of the path, discarding till basepath and `/`
-                rest_path = path[len(basepath) + 1:]
+                rest_path = path[len(basepath.rstrip(os.sep)) + 1:]
                 return rest_path or self.VIRTUAL_ROOT
         return None
 
-    def is_blacklisted(self, virtual_path):
-        """ Returns `True` if `virtual_path` matches the blacklisted paths """
+    def get_basepath(self, path):
+        """
+        Returns the one of :py:attr:`basepaths` the absolute `path` is located
+        under, or None.
+        """
+        path = to_unicode(path)
+        for basepath in self.basepaths:
+            if is_under(path, basepath):
+                return basepath
+        return None
 
-        if not self.blacklist:
+    @classmethod
+    def is_blacklisted(cls, virtual_path):
+        """
+        Returns `True` if `virtual_path` matches the blacklisted paths or is
+        the temporary file of an upload.
+        """
+        if is_part(virtual_path):
+            return True
+        if not cls.blacklist:
             return False
         # Strip out any leading path component characters
-        if virtual_path.startswith(self.VIRTUAL_ROOT):
+        if virtual_path.startswith(cls.VIRTUAL_ROOT):
             virtual_path = virtual_path[1:]
         virtual_path = virtual_path.lstrip('/')
 
-        return any((p.search(virtual_path) for p in self._blacklist_rx))
+        return any((p.search(virtual_path) for p in cls._blacklist_rx))
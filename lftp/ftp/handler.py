@@ -0,0 +1,179 @@
+"""
+This module contains pyftpdlib FTP handler.
+"""
+
+from __future__ import unicode_literals
+
+from pyftpdlib.handlers import FTPHandler, DTPHandler, _strerror
+from pyftpdlib.filesystems import FilesystemError
+from pyftpdlib.log import logger
+
+from ..utils.pool import get_pool
+from .listing import ListingProducer
+
+
+class LFTPDTPHandler(DTPHandler):
+    """
+    Data channel handler which publishes a completely received upload before
+    the transfer is reported as complete to the client, so the file is
+    already in place when the client gets the response.
+
+    Producers which have a ``ready()`` method, such as
+    :py:class:`~lftp.ftp.listing.ListingProducer`, are polled every
+    :py:attr:`producer_poll_interval` seconds until they are ready, instead
+    of blocking the io loop while they prepare their data.
+    """
+
+    producer_poll_interval = 0.01
+
+    _producer_wait = None
+
+    def initiate_send(self):
+        producer = self.producer_fifo[0] if self.producer_fifo else None
+        ready = getattr(producer, 'ready', None)
+        if ready is not None and not ready():
+            # stop the write events, which would call this again right away
+            self.modify_ioloop_events(0)
+            if self._producer_wait is None:
+                self._producer_wait = self.ioloop.call_later(
+                    self.producer_poll_interval, self.resume_send)
+            return
+        DTPHandler.initiate_send(self)
+
+    def resume_send(self):
+        self._producer_wait = None
+        self.modify_ioloop_events(self.ioloop.WRITE)
+        self.initiate_send()
+
+    def close(self):
+        if self._producer_wait is not None:
+            self._producer_wait.cancel()
+            self._producer_wait = None
+        file_obj = self.file_obj
+        if (not self._closed and self.receive and self.transfer_finished and
+                file_obj is not None and not file_obj.closed):
+            try:
+                self.cmd_channel.fs.publish_upload(file_obj)
+            except (OSError, FilesystemError) as err:
+                self._resp = ('550 %s.' % _strerror(err), logger.error)
+        DTPHandler.close(self)
+
+
+class LFTPHandler(FTPHandler):
+    """
+    FTP handler which publishes uploads received through
+    :py:class:`~lftp.ftp.filesystem.UnifiedFilesystem` only after they were
+    transferred completely, and sends directory listings in batches.
+    """
+
+    dtp_handler = LFTPDTPHandler
+
+    # Optional :py:class:`~lftp.ftp.transfers.TransferLog` instance
+    transfer_log = None
+    # Optional :py:class:`~lftp.ftp.trace.CommandTrace` instance
+    command_trace = None
+
+    # Number of listing entries formatted in one go
+    listing_batch_size = 100
+    # Number of threads to read listings in, 0 to read them on the io loop
+    listing_threads = 0
+
+    def on_incomplete_file_received(self, file):
+        """
+        Keep the partially received `file` hidden, so that the transfer can be
+        resumed later.
+        """
+        self.fs.abandon_upload(file)
+
+    def ftp_SIZE(self, path):
+        """
+        Return size of file in a format suitable for using with RESTart as
+        defined in RFC-3659. If there is an interrupted upload of `path`, the
+        size of its temporary file is returned instead, as clients look it up
+        to resume the upload.
+        """
+        if self._current_type != 'a':
+            try:
+                size = self.run_as_current_user(self.fs.get_upload_size, path)
+            except (OSError, FilesystemError) as err:
+                self.respond('550 %s.' % _strerror(err))
+                return
+            if size is not None:
+                self.respond('213 %s' % size)
+                return
+        return FTPHandler.ftp_SIZE(self, path)
+
+    def pre_process_command(self, line, cmd, arg):
+        """
+        Add the command to the :py:attr:`command_trace` before processing it.
+        """
+        if self.command_trace is not None:
+            session = '{}:{}@{}'.format(self.remote_ip, self.remote_port,
+                                        self.started)
+            self.command_trace.record(session=session,
+                                      user=self.username,
+                                      cmd=cmd,
+                                      arg=arg)
+        FTPHandler.pre_process_command(self, line, cmd, arg)
+
+    def log_transfer(self, cmd, filename, receive, completed, elapsed, bytes):
+        """
+        Log the transfer and add it to the :py:attr:`transfer_log`.
+        """
+        FTPHandler.log_transfer(self, cmd, filename, receive, completed,
+                                elapsed, bytes)
+        if self.transfer_log is None:
+            return
+        self.transfer_log.record(user=self.username,
+                                 cmd=cmd,
+                                 path=self.fs.get_virtual_path(filename),
+                                 basepath=self.fs.get_basepath(filename),
+                                 bytes=bytes,
+                                 duration=elapsed,
+                                 completed=completed,
+                                 receive=receive)
+
+    def ftp_LIST(self, path):
+        """
+        Return a list of files in the specified directory to the client. The
+        directory is read while the listing is being sent.
+        """
+        if not self.fs.isdir(path):
+            return FTPHandler.ftp_LIST(self, path)
+        try:
+            listing = self.run_as_current_user(self.fs.iterdir, path)
+        except (OSError, FilesystemError) as err:
+            self.respond('550 %s.' % _strerror(err))
+            return
+        iterator = self.fs.format_list(path, listing)
+        self.push_dtp_data(self.listing_producer(iterator), isproducer=True,
+                           cmd='LIST')
+        return path
+
+    def ftp_MLSD(self, path):
+        """
+        Return contents of a directory in a machine-processable form as
+        defined in RFC-3659. The directory is read while the listing is being
+        sent.
+        """
+        # RFC-3659 requires 501 response code if path is not a directory
+        if not self.fs.isdir(path):
+            self.respond('501 No such directory.')
+            return
+        try:
+            listing = self.run_as_current_user(self.fs.iterdir, path)
+        except (OSError, FilesystemError) as err:
+            self.respond('550 %s.' % _strerror(err))
+            return
+        perms = self.authorizer.get_perms(self.username)
+        iterator = self.fs.format_mlsx(path, listing, perms,
+                                       self._current_facts)
+        self.push_dtp_data(self.listing_producer(iterator), isproducer=True,
+                           cmd='MLSD')
+        return path
+
+    def listing_producer(self, iterator):
+        pool = None
+        if self.listing_threads:
+            pool = get_pool('listing', self.listing_threads)
+        return ListingProducer(iterator, self.listing_batch_size, pool=pool)
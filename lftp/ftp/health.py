@@ -0,0 +1,161 @@
+"""
+This module contains BasepathHealth and HealthMonitor, which keep track of
+basepaths on unresponsive mounts and take them out of path resolution until
+they recover.
+"""
+
+from __future__ import unicode_literals
+
+import os
+import time
+import errno
+import logging
+import threading
+import multiprocessing
+
+from multiprocessing.sharedctypes import RawArray
+
+from ..utils.pool import get_pool
+
+
+def raise_timeout_error(path):
+    raise OSError(errno.ETIMEDOUT,
+                  'Storage not responding {}'.format(path), path)
+
+
+class BasepathHealth(object):
+    """
+    Runs filesystem operations on `basepaths` in a thread pool with a
+    `timeout`, acting as a circuit breaker for each basepath: when an
+    operation times out, the basepath is considered down for `cooldown`
+    seconds, during which operations on it fail immediately.
+
+    The state is stored in shared memory, which must be created before the
+    worker processes are forked, so a basepath tripped by one process is
+    skipped by all of them.
+
+    A `timeout` of 0 disables the thread pool, and operations are executed
+    directly.
+    """
+
+    def __init__(self, basepaths, timeout=2, cooldown=30, threads=4):
+        self.basepaths = tuple(basepaths)
+        self.timeout = timeout
+        self.cooldown = cooldown
+        self.threads = threads
+        count = len(self.basepaths)
+        self._down_until = RawArray(str('d'), count)
+        self._latency = RawArray(str('d'), count)
+        self._failures = RawArray(str('i'), count)
+        # operations of the current process which timed out and did not
+        # return yet, indexed by basepath
+        self._stuck = {}
+        self._stuck_pid = None
+
+    def available(self, index):
+        """
+        Returns `True` if operations on basepath at `index` may be attempted
+        """
+        if self._is_stuck(index):
+            return False
+        return time.time() >= self._down_until[index]
+
+    def run(self, index, func, *args):
+        """
+        Call `func` with `args` for basepath at `index` and return the result.
+        :py:exc:`OSError` is raised if the basepath is down or the call does
+        not complete within the timeout.
+        """
+        if not self.available(index):
+            raise_timeout_error(self.basepaths[index])
+        return self._run(index, func, *args)
+
+    def probe(self, index):
+        """
+        Check whether basepath at `index` responds, recording the latency.
+        Unlike :py:meth:`run` this is attempted even if the basepath is down,
+        so that a basepath which is still not responding is taken out of use
+        again. The circuit is closed if the basepath responds and its
+        cooldown period is over.
+        """
+        if self._is_stuck(index):
+            # keep the basepath down for as long as the operation hangs, in
+            # all the processes
+            self._down_until[index] = max(self._down_until[index],
+                                          time.time() + self.cooldown)
+            return False
+        start = time.time()
+        try:
+            self._run(index, os.stat, self.basepaths[index])
+        except OSError:
+            return False
+        now = time.time()
+        self._latency[index] = now - start
+        if now >= self._down_until[index]:
+            self._down_until[index] = 0
+            self._failures[index] = 0
+        return True
+
+    def trip(self, index):
+        """ Take basepath at `index` out of use for the cooldown period """
+        self._failures[index] += 1
+        self._down_until[index] = time.time() + self.cooldown
+        logging.warning('FTP basepath {} is not responding'.format(
+            self.basepaths[index]))
+
+    def status(self):
+        """
+        Return a list of dicts describing the health of each basepath.
+        """
+        return [dict(path=path,
+                     available=self.available(index),
+                     latency=self._latency[index],
+                     failures=self._failures[index])
+                for index, path in enumerate(self.basepaths)]
+
+    def _run(self, index, func, *args):
+        if not self.timeout:
+            return func(*args)
+        result = get_pool('health', self.threads).apply_async(func, args)
+        try:
+            return result.get(self.timeout)
+        except multiprocessing.TimeoutError:
+            self._stuck[index] = result
+            self.trip(index)
+            raise_timeout_error(self.basepaths[index])
+
+    def _is_stuck(self, index):
+        # operations of the parent process do not belong to forked children
+        if self._stuck_pid != os.getpid():
+            self._stuck = {}
+            self._stuck_pid = os.getpid()
+        result = self._stuck.get(index)
+        if result is None:
+            return False
+        if result.ready():
+            self._stuck.pop(index, None)
+            return False
+        return True
+
+
+class HealthMonitor(threading.Thread):
+    """
+    Background thread which probes each basepath tracked by `health` every
+    `interval` seconds, bringing recovered basepaths back into use.
+    """
+
+    def __init__(self, health, interval=10):
+        super(HealthMonitor, self).__init__()
+        self.daemon = True
+        self.health = health
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            for index in range(len(self.health.basepaths)):
+                self.health.probe(index)
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
@@ -0,0 +1,43 @@
+"""
+This module contains ListingProducer, which feeds directory listings to the
+data channel in bounded batches.
+"""
+
+from __future__ import unicode_literals
+
+from itertools import islice
+
+
+class ListingProducer(object):
+    """
+    Producer for the lines of a directory listing generated by `iterator`.
+
+    Each call to :py:meth:`more` formats at most `batch_size` entries, so
+    that the io loop gets to serve other connections between two batches no
+    matter how large the directory is. If `pool` is given, the next batch is
+    read and formatted on the pool while the current one is being sent, and
+    :py:meth:`ready` tells whether :py:meth:`more` can return it without
+    blocking.
+    """
+
+    def __init__(self, iterator, batch_size=100, pool=None):
+        self.iterator = iterator
+        self.batch_size = batch_size
+        self.pool = pool
+        self._pending = None
+
+    def ready(self):
+        return self._pending is None or self._pending.ready()
+
+    def read_batch(self):
+        return b''.join(islice(self.iterator, self.batch_size))
+
+    def more(self):
+        if self._pending is not None:
+            data = self._pending.get()
+            self._pending = None
+        else:
+            data = self.read_batch()
+        if data and self.pool is not None:
+            self._pending = self.pool.apply_async(self.read_batch)
+        return data
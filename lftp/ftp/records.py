@@ -0,0 +1,136 @@
+"""
+This module contains RecordLog, which collects records from the FTP worker
+processes and writes them to rotating JSONL files from a background thread of
+the server process.
+"""
+
+from __future__ import unicode_literals
+
+import os
+import io
+import json
+import logging
+import threading
+import multiprocessing
+
+from collections import deque
+
+try:
+    from queue import Empty, Full
+except ImportError:
+    from Queue import Empty, Full
+
+
+class RecordLog(object):
+    """
+    Bounded, non-blocking log of JSON records.
+
+    Worker processes add records with :py:meth:`put`, which puts them on a
+    queue shared with the server process. If the queue is full, because the
+    writer cannot keep up, the record is dropped and counted instead of
+    blocking the caller.
+
+    In the server process a background thread started with :py:meth:`start`
+    takes the records off the queue, keeps the most recent `buffer_size` of
+    them in memory in :py:attr:`recent`, and appends them in batches of up to
+    `batch_size` records to the JSONL file at `path`. The file is rotated when
+    it grows over `max_size` bytes, keeping `backups` old files.
+
+    The log must be created before the worker processes are forked.
+    """
+
+    def __init__(self, path, max_size=10 * 1024 * 1024, backups=5,
+                 queue_size=10000, buffer_size=10000, batch_size=500,
+                 flush_interval=1):
+        self.path = path
+        self.max_size = max_size
+        self.backups = backups
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.recent = deque(maxlen=buffer_size)
+        self._recent_lock = threading.Lock()
+        self._queue = multiprocessing.Queue(queue_size)
+        self._dropped = multiprocessing.Value(str('L'), 0)
+        self._stop_event = threading.Event()
+        self._writer = None
+
+    @property
+    def dropped(self):
+        return self._dropped.value
+
+    def put(self, entry):
+        """
+        Add the `entry` dict to the log, or count it as dropped if the queue
+        is full.
+        """
+        try:
+            self._queue.put_nowait(entry)
+        except Full:
+            with self._dropped.get_lock():
+                self._dropped.value += 1
+
+    def recent_records(self):
+        """ Return a list of the most recent records """
+        with self._recent_lock:
+            return list(self.recent)
+
+    def start(self):
+        self._stop_event.clear()
+        self._writer = threading.Thread(target=self._run)
+        self._writer.daemon = True
+        self._writer.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._writer:
+            self._writer.join()
+            self._writer = None
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            batch = self._read_batch()
+            if batch:
+                self._flush(batch)
+        # write out whatever is still waiting in the queue
+        batch = self._read_batch(block=False)
+        while batch:
+            self._flush(batch)
+            batch = self._read_batch(block=False)
+
+    def _flush(self, batch):
+        with self._recent_lock:
+            self.recent.extend(batch)
+        try:
+            self._write(batch)
+        except (IOError, OSError):
+            logging.exception('Unable to write records to {}'.format(
+                self.path))
+
+    def _read_batch(self, block=True):
+        batch = []
+        try:
+            if block:
+                batch.append(self._queue.get(timeout=self.flush_interval))
+            while len(batch) < self.batch_size:
+                batch.append(self._queue.get_nowait())
+        except Empty:
+            pass
+        return batch
+
+    def _write(self, batch):
+        lines = ''.join(json.dumps(entry) + '\n' for entry in batch)
+        with io.open(self.path, 'a', encoding='utf8') as f:
+            f.write(lines)
+            size = f.tell()
+        if size >= self.max_size:
+            self._rotate()
+
+    def _rotate(self):
+        for index in range(self.backups - 1, 0, -1):
+            src = '{}.{}'.format(self.path, index)
+            if os.path.exists(src):
+                os.rename(src, '{}.{}'.format(self.path, index + 1))
+        if self.backups:
+            os.rename(self.path, '{}.1'.format(self.path))
+        else:
+            os.remove(self.path)
@@ -0,0 +1,32 @@
+"""
+This module contains CommandTrace, which records the commands received by
+the FTP server, so that the sessions can be replayed later using
+``scripts/replay.py``.
+"""
+
+from __future__ import unicode_literals
+
+import time
+
+from .records import RecordLog
+
+
+class CommandTrace(RecordLog):
+    """
+    :py:class:`RecordLog` of the commands received by the FTP server. Each
+    record holds the time the command was received at, the session it was
+    received on, the user and the command with its argument. Passwords are
+    not recorded.
+    """
+
+    def record(self, session, user, cmd, arg):
+        """
+        Add a record of command `cmd` with argument `arg`.
+        """
+        if cmd == 'PASS':
+            arg = ''
+        self.put(dict(time=time.time(),
+                      session=session,
+                      user=user,
+                      cmd=cmd,
+                      arg=arg))
@@ -0,0 +1,90 @@
+"""
+This module contains TransferLog, which collects a record of every file
+transfer made by the FTP worker processes and computes statistics about them.
+"""
+
+from __future__ import unicode_literals
+
+import time
+
+from .records import RecordLog
+
+
+UPLOAD = 'upload'
+DOWNLOAD = 'download'
+
+
+class TransferLog(RecordLog):
+    """
+    :py:class:`RecordLog` of file transfers, which keeps the recent records
+    in memory to compute statistics with :py:meth:`aggregate`.
+    """
+
+    def record(self, user, cmd, path, basepath, bytes, duration, completed,
+               receive):
+        """
+        Add a record of a transfer.
+        """
+        entry = dict(time=time.time(),
+                     user=user,
+                     cmd=cmd,
+                     path=path,
+                     basepath=basepath,
+                     bytes=bytes,
+                     duration=duration,
+                     result='completed' if completed else 'incomplete',
+                     direction=UPLOAD if receive else DOWNLOAD)
+        self.put(entry)
+
+    def aggregate(self, window=300):
+        """
+        Return a dict of statistics about the transfers which ended within the
+        last `window` seconds.
+        """
+        since = time.time() - window
+        totals = _Totals()
+        by_basepath = {}
+        by_user = {}
+        for entry in self.recent_records():
+            if entry['time'] < since:
+                continue
+            totals.add(entry)
+            by_basepath.setdefault(entry['basepath'], _Totals()).add(entry)
+            by_user.setdefault(entry['user'], _Totals()).add(entry)
+        result = totals.as_dict()
+        result.update(
+            window=window,
+            dropped=self.dropped,
+            basepaths=dict((k, v.as_dict()) for k, v in by_basepath.items()),
+            users=dict((k, v.as_dict()) for k, v in by_user.items()))
+        return result
+
+
+class _Totals(object):
+    """ Accumulator of transfer statistics """
+
+    def __init__(self):
+        self.transfers = 0
+        self.incomplete = 0
+        self.uploaded = 0
+        self.downloaded = 0
+        self.duration = 0.0
+
+    def add(self, entry):
+        self.transfers += 1
+        if entry['result'] != 'completed':
+            self.incomplete += 1
+        if entry['direction'] == UPLOAD:
+            self.uploaded += entry['bytes']
+        else:
+            self.downloaded += entry['bytes']
+        self.duration += entry['duration']
+
+    def as_dict(self):
+        transferred = self.uploaded + self.downloaded
+        return dict(transfers=self.transfers,
+                    incomplete=self.incomplete,
+                    uploaded=self.uploaded,
+                    downloaded=self.downloaded,
+                    throughput=(transferred / self.duration
+                                if self.duration else 0))
@@ -0,0 +1,267 @@
+"""
+This module contains PartialUpload, PartCleaner and related functions, which
+are used by UnifiedFilesystem to receive uploads into hidden temporary files
+that are published atomically once the transfer completes.
+"""
+
+from __future__ import unicode_literals
+
+import os
+import time
+import uuid
+import errno
+import fcntl
+import logging
+import threading
+
+
+PART_PREFIX = '.'
+PART_SUFFIX = '.lftp-part'
+
+
+def part_path(path, unique=False):
+    """
+    Return the path of the hidden temporary file used to upload `path`. If
+    `unique` is set, the name is unique to the calling upload, instead of the
+    name interrupted uploads are resumed from.
+    """
+    head, tail = os.path.split(path)
+    if unique:
+        tail = '{}.{}'.format(tail, uuid.uuid4().hex[:8])
+    return os.path.join(head, PART_PREFIX + tail + PART_SUFFIX)
+
+
+def is_part(path):
+    """ Returns `True` if `path` points to an upload temporary file """
+    name = os.path.basename(path)
+    return name.startswith(PART_PREFIX) and name.endswith(PART_SUFFIX)
+
+
+def lock(fd):
+    """
+    Take an exclusive lock on file descriptor `fd`. Returns `False` if the
+    lock is held by someone else.
+    """
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except IOError as exc:
+        if exc.errno in (errno.EAGAIN, errno.EACCES):
+            return False
+        raise
+    return True
+
+
+def is_open_at(fd, path):
+    """ Returns `True` if file descriptor `fd` is the file found at `path` """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return False
+    fst = os.fstat(fd)
+    return (st.st_dev, st.st_ino) == (fst.st_dev, fst.st_ino)
+
+
+def open_part(path, mode, new=False):
+    """
+    Open the temporary file at `path` in `mode` and lock it, so that no two
+    uploads write to it at once. :py:exc:`OSError` with ``EBUSY`` is raised
+    if another upload holds the lock.
+
+    The file is created if needed and emptied once the lock is held if `new`
+    is set or `mode` is a write mode.
+    """
+    new = new or 'w' in mode
+    flags = os.O_RDWR if '+' in mode else os.O_WRONLY
+    if new or 'a' in mode:
+        flags |= os.O_CREAT
+    if 'a' in mode:
+        flags |= os.O_APPEND
+    while True:
+        fd = os.open(path, flags, 0o666)
+        try:
+            if not lock(fd):
+                raise OSError(errno.EBUSY,
+                              'Upload in progress {}'.format(path), path)
+        except Exception:
+            os.close(fd)
+            raise
+        if is_open_at(fd, path):
+            break
+        # the file was published by the upload which held the lock, so it is
+        # not the temporary file anymore
+        os.close(fd)
+    if new:
+        os.ftruncate(fd, 0)
+    return os.fdopen(fd, mode)
+
+
+def remove_part(path):
+    """
+    Remove the temporary file at `path` unless an upload holds its lock.
+    Returns `True` if the file was removed.
+    """
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        if not lock(fd) or not is_open_at(fd, path):
+            return False
+        os.remove(path)
+        return True
+    finally:
+        os.close(fd)
+
+
+def fsync_dir(path):
+    """
+    Flush the directory entry of `path` to disk, so that a rename into
+    ``path`` survives a crash. Platforms which do not support opening
+    directories are silently ignored.
+    """
+    try:
+        fd = os.open(os.path.dirname(path), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class PartialUpload(object):
+    """
+    File-like wrapper around the temporary file of an upload in progress.
+
+    The :py:attr:`name` attribute reports the final path of the upload, so
+    that pyftpdlib callbacks receive the path the client asked for, while the
+    data itself is written to :py:attr:`part_path`. The lock taken by
+    :py:func:`open_part` is held until the file is closed.
+
+    If `fsync_bytes` is a positive number, the written data is flushed to disk
+    each time that many bytes have been written since the last flush. If
+    `fsync_on_close` is set, the data is flushed when the file is closed.
+    """
+
+    def __init__(self, fileobj, path, part_path, fsync_bytes=0,
+                 fsync_on_close=True):
+        self.fileobj = fileobj
+        self.name = path
+        self.part_path = part_path
+        self.fsync_bytes = fsync_bytes
+        self.fsync_on_close = fsync_on_close
+        self._unsynced = 0
+
+    @property
+    def closed(self):
+        return self.fileobj.closed
+
+    def write(self, data):
+        self.fileobj.write(data)
+        if self.fsync_bytes > 0:
+            self._unsynced += len(data)
+            if self._unsynced >= self.fsync_bytes:
+                self.fsync()
+
+    def fsync(self):
+        self.fileobj.flush()
+        os.fsync(self.fileobj.fileno())
+        self._unsynced = 0
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        # REST is validated against the size reported by the filesystem,
+        # seeking past the end of the temporary file would leave a hole in
+        # the published file instead
+        if whence == os.SEEK_SET:
+            size = os.fstat(self.fileobj.fileno()).st_size
+            if offset > size:
+                raise ValueError('Offset {} is past the end of the upload '
+                                 '({} bytes)'.format(offset, size))
+        return self.fileobj.seek(offset, whence)
+
+    def tell(self):
+        return self.fileobj.tell()
+
+    def fileno(self):
+        return self.fileobj.fileno()
+
+    def flush(self):
+        self.fileobj.flush()
+
+    def close(self):
+        if self.fileobj.closed:
+            return
+        try:
+            if self.fsync_on_close:
+                self.fsync()
+        finally:
+            self.fileobj.close()
+
+
+class PartCleaner(threading.Thread):
+    """
+    Background thread which walks `basepaths` every `interval` seconds and
+    removes the temporary files of uploads which were not resumed within
+    `max_age` seconds. Temporary files of uploads in progress are kept. If
+    `health` is set, the filesystem operations go through it, so that
+    basepaths which do not respond are skipped.
+    """
+
+    def __init__(self, basepaths, max_age=604800, interval=3600, health=None):
+        super(PartCleaner, self).__init__()
+        self.daemon = True
+        self.basepaths = basepaths
+        self.max_age = max_age
+        self.interval = interval
+        self.health = health
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.clean()
+            except Exception:
+                logging.exception('Error while removing expired uploads')
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+
+    def clean(self):
+        """ Remove the expired temporary files found under the basepaths """
+        expired = time.time() - self.max_age
+        removed = 0
+        for index, basepath in enumerate(self.basepaths):
+            walk = os.walk(basepath)
+            while True:
+                if self._stop_event.is_set():
+                    return
+                try:
+                    # each directory is read separately, so that the walk
+                    # stops as soon as the basepath does not respond
+                    item = self.call(index, next, walk, None)
+                except OSError:
+                    break
+                if item is None:
+                    break
+                dirpath, _, filenames = item
+                for name in filenames:
+                    if not is_part(name):
+                        continue
+                    path = os.path.join(dirpath, name)
+                    try:
+                        st = self.call(index, os.stat, path)
+                        if (st.st_mtime < expired and
+                                self.call(index, remove_part, path)):
+                            removed += 1
+                    except OSError:
+                        continue
+        logging.debug('Removed {} expired uploads'.format(removed))
+
+    def call(self, index, func, *args):
+        """
+        Call `func` with `args` for basepath at `index`, through
+        :py:attr:`health` if configured.
+        """
+        if self.health is None:
+            return func(*args)
+        return self.health.run(index, func, *args)
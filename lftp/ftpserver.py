@@ -9,10 +9,16 @@ import logging
 import threading
 
 from pyftpdlib.servers import MultiprocessFTPServer
-from pyftpdlib.handlers import FTPHandler
 
+from .ftp.cache import SharedPathCache
 from .ftp.authorizer import FTPAuthorizer
-from .ftp.filesystem import UnifiedFilesystem
+from .ftp.duplicates import DuplicateIndex, DuplicateScanner
+from .ftp.health import BasepathHealth, HealthMonitor
+from .ftp.trace import CommandTrace
+from .ftp.transfers import TransferLog
+from .ftp.upload import PartCleaner
+from .ftp.handler import LFTPHandler
+from .ftp.filesystem import UnifiedFilesystem, is_under
 
 
 class LFTPServer(object):
@@ -23,6 +29,11 @@ class LFTPServer(object):
 
         self.ftp_server = None
         self.ftp_server_thread = None
+        self.duplicates_scanner = None
+        self.health_monitor = None
+        self.transfer_log = None
+        self.command_trace = None
+        self.part_cleaner = None
 
     @property
     def enabled(self):
@@ -39,18 +50,41 @@ class LFTPServer(object):
     def status(self):
         return self.enabled and self.ftp_server
 
+    @property
+    def health_status(self):
+        if not self.health_monitor:
+            return None
+        return self.health_monitor.health.status()
+
+    @property
+    def duplicates_report(self):
+        if not self.duplicates_scanner:
+            return None
+        return self.duplicates_scanner.index.report()
+
     def setup_ftp(self):
         if self.ftp_server:
             return
-        handler = FTPHandler
+        handler = LFTPHandler
         handler.authorizer = FTPAuthorizer()
 
         basepaths = self.get_basepaths()
         assert len(basepaths) > 0, 'Atleast one basepath expected'
 
         handler.abstracted_fs = UnifiedFilesystem
-        handler.abstracted_fs.basepaths = basepaths
-        handler.abstracted_fs.blacklist = self.config.get('ftp.blacklist')
+        handler.abstracted_fs.configure(
+            basepaths,
+            blacklist=self.config.get('ftp.blacklist'),
+            cache=self.create_cache(),
+            health=self.create_health(basepaths),
+            duplicates=self.create_duplicates_index(),
+            fsync_bytes=self.config.get('ftp.upload_fsync_bytes', 0),
+            fsync_on_publish=self.config.get('ftp.upload_fsync', True),
+            sort_limit=self.config.get('ftp.listing_sort_limit', 1000))
+        handler.listing_batch_size = self.config.get('ftp.listing_batch', 100)
+        handler.listing_threads = self.config.get('ftp.listing_threads', 0)
+        handler.transfer_log = self.transfer_log = self.create_transfer_log()
+        handler.command_trace = self.command_trace = self.create_trace()
         handler.use_sendfile = True
         handler.authorizer.add_anonymous(basepaths[0])
         # execute setup hooks with the handler instance
@@ -59,8 +93,30 @@ class LFTPServer(object):
 
         address = ('', self.config['ftp.port'])
         self.ftp_server = MultiprocessFTPServer(address, handler)
+        if self.transfer_log:
+            self.transfer_log.start()
+        if self.command_trace:
+            self.command_trace.start()
+        self.start_health_monitor(handler.abstracted_fs)
+        self.start_duplicates_scanner(handler.abstracted_fs)
+        self.start_part_cleaner(handler.abstracted_fs)
 
     def teardown_ftp(self):
+        if self.transfer_log:
+            self.transfer_log.stop()
+            self.transfer_log = None
+        if self.command_trace:
+            self.command_trace.stop()
+            self.command_trace = None
+        if self.health_monitor:
+            self.health_monitor.stop()
+            self.health_monitor = None
+        if self.duplicates_scanner:
+            self.duplicates_scanner.stop()
+            self.duplicates_scanner = None
+        if self.part_cleaner:
+            self.part_cleaner.stop()
+            self.part_cleaner = None
         self.ftp_server.close_all()
         self.ftp_server = None
         logging.info('FTP server stopped')
@@ -100,6 +156,123 @@ class LFTPServer(object):
         elif not enabled and self.ftp_server:
             self.stop_ftp()
 
+    def create_cache(self):
+        # The cache has to be created before the worker processes are forked
+        # so that all of them share it
+        slots = self.config.get('ftp.cache_slots', 4096)
+        if not slots:
+            return None
+        return SharedPathCache(slots, ttl=self.config.get('ftp.cache_ttl', 5))
+
+    def create_health(self, basepaths):
+        # The health state has to be created before the worker processes are
+        # forked so that all of them share it
+        timeout = self.config.get('ftp.probe_timeout', 0)
+        if not timeout:
+            return None
+        return BasepathHealth(
+            basepaths,
+            timeout=timeout,
+            cooldown=self.config.get('ftp.probe_cooldown', 30),
+            threads=self.config.get('ftp.probe_threads', 4))
+
+    def start_health_monitor(self, fs):
+        if not fs.health:
+            return
+        self.health_monitor = HealthMonitor(
+            fs.health, interval=self.config.get('ftp.probe_interval', 10))
+        self.health_monitor.start()
+
+    def create_transfer_log(self):
+        # The log has to be created before the worker processes are forked,
+        # so that all of them send their records to this process
+        path = self.config.get('ftp.transfer_log')
+        if not path:
+            return None
+        return TransferLog(
+            path,
+            max_size=self.config.get('ftp.transfer_log_size', 10485760),
+            backups=self.config.get('ftp.transfer_log_backups', 5),
+            queue_size=self.config.get('ftp.transfer_log_queue', 10000))
+
+    def create_trace(self):
+        path = self.config.get('ftp.trace_log')
+        if not path:
+            return None
+        return CommandTrace(
+            path,
+            max_size=self.config.get('ftp.trace_log_size', 104857600),
+            backups=self.config.get('ftp.trace_log_backups', 5),
+            buffer_size=0)
+
+    def transfer_stats(self, window=300):
+        if not self.transfer_log:
+            return None
+        return self.transfer_log.aggregate(window)
+
+    def create_duplicates_index(self):
+        policy = self.config.get('ftp.duplicates')
+        if not policy:
+            return None
+        return DuplicateIndex(policy)
+
+    def start_duplicates_scanner(self, fs):
+        if not fs.duplicates:
+            return
+        self.duplicates_scanner = DuplicateScanner(
+            fs.basepaths,
+            fs.duplicates,
+            interval=self.config.get('ftp.duplicates_interval', 3600),
+            is_blacklisted=fs.is_blacklisted,
+            health=fs.health)
+        self.duplicates_scanner.start()
+
+    def start_part_cleaner(self, fs):
+        max_age = self.config.get('ftp.upload_expiry', 604800)
+        if not max_age:
+            return
+        self.part_cleaner = PartCleaner(
+            fs.basepaths,
+            max_age=max_age,
+            interval=self.config.get('ftp.upload_cleanup_interval', 3600),
+            health=fs.health)
+        self.part_cleaner.start()
+
+    def invalidate_cache(self, path=None):
+        """
+        Drop the cached path lookups affected by a change made to `path`
+        outside of the FTP server, e.g. by another librarian component.
+        `path` is either absolute or relative to ``ftp.basepaths``, like the
+        paths FSAL works with. The whole cache is dropped if it is omitted.
+        """
+        fs = self.ftp_server and self.ftp_server.handler.abstracted_fs
+        if not fs:
+            return
+        if path is not None:
+            path = self.get_virtual_path(path)
+            if path is None:
+                # the path is not served by the FTP server
+                return
+        fs.invalidate_cached(path)
+
+    def get_virtual_path(self, path):
+        """
+        Returns absolute `path` or `path` relative to ``ftp.basepaths``
+        relative to the basepaths served by the FTP server, i.e. to the chroot
+        directory, or `None` if it is outside of them.
+        """
+        path = os.path.normpath(path)
+        if os.path.isabs(path):
+            for basepath in self.get_basepaths():
+                if is_under(path, basepath):
+                    return os.path.relpath(path, basepath)
+            return None
+        chroot = os.path.normpath(self.config.get('ftp.chroot') or '.')
+        path = os.path.relpath(path, chroot)
+        if path == os.pardir or path.startswith(os.pardir + os.sep):
+            return None
+        return path
+
     def get_basepaths(self):
         chroot = self.config.get('ftp.chroot') or ''
         return [os.path.abspath(os.path.join(path, chroot))
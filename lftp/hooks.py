@@ -4,7 +4,11 @@ This module contains lftp hooks for librarian component lifecycle.
 
 import functools
 
+import gevent
+
 from .ftpserver import LFTPServer
+from .control.commands import CommandHandler
+from .control.server import ControlServer
 
 from librarian.core.contrib.auth.users import User
 from librarian.core.exports import hook
@@ -51,7 +55,46 @@ def register_onmodify(handler):
     Register a callback function to be invoked when a path is being modified
     in some way (created, deleted, renamed, ...).
     """
-    handler.abstracted_fs.on_modified.append(exts.fsal.refresh_path)
+    refresh_path = exts.fsal.refresh_path
+    # changes made through the FTP server invalidate its cache on their own
+    refresh_path = getattr(refresh_path, 'uncached', refresh_path)
+    handler.abstracted_fs.on_modified.append(refresh_path)
+
+
+def invalidate_on_refresh(ftp_server):
+    """
+    Drop the cached path lookups of the FTP server whenever other components
+    ask FSAL to refresh a path they modified.
+    """
+    refresh_path = exts.fsal.refresh_path
+
+    @functools.wraps(refresh_path)
+    def wrapper(path=None, *args, **kwargs):
+        ftp_server.invalidate_cache(path)
+        return refresh_path(path, *args, **kwargs)
+    wrapper.uncached = refresh_path
+    exts.fsal.refresh_path = wrapper
+
+
+def start_control_server(supervisor, ftp_server):
+    """
+    Start the control server which answers queries about `ftp_server` on the
+    socket at ``ftp.control_socket``, if it is set.
+    """
+    socket_path = supervisor.config.get('ftp.control_socket')
+    if not socket_path:
+        return None
+    control_server = ControlServer(supervisor.config,
+                                   CommandHandler(ftp_server),
+                                   socket_path=socket_path)
+    gevent.spawn(control_server.run)
+    return control_server
+
+
+def stop(supervisor):
+    supervisor.exts.ftp_server.stop()
+    if supervisor.exts.ftp_control_server:
+        supervisor.exts.ftp_control_server.stop()
 
 
 @hook('post_start')
@@ -60,14 +103,17 @@ def post_start(supervisor):
                             supervisor.exts.setup,
                             setup_hooks=(install_users, register_onmodify))
     ftp_server.start()
+    invalidate_on_refresh(ftp_server)
     supervisor.exts.ftp_server = ftp_server
+    supervisor.exts.ftp_control_server = start_control_server(supervisor,
+                                                              ftp_server)
 
 
 @hook('shutdown')
 def shutdown(supervisor):
-    supervisor.exts.ftp_server.stop()
+    stop(supervisor)
 
 
 @hook('immediate_shutdown')
 def immediate_shutdown(supervisor):
-    supervisor.exts.ftp_server.stop()
+    stop(supervisor)
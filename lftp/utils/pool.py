@@ -0,0 +1,24 @@
+"""
+This module contains utility functions to manage thread pools in the worker
+processes of the FTP server
+"""
+
+import os
+
+from multiprocessing.pool import ThreadPool
+
+
+_pools = {}
+
+
+def get_pool(name, size):
+    """
+    Return the thread pool called `name` of the current process, creating it
+    with `size` threads if needed. Threads do not survive forking, so each
+    worker process of the FTP server gets its own pools.
+    """
+    key = (name, os.getpid())
+    pool = _pools.get(key)
+    if pool is None:
+        pool = _pools[key] = ThreadPool(size)
+    return pool
@@ -0,0 +1,27 @@
+<%
+    differing = duplicates['differing']
+    limit = 20
+%>
+<h3>${_('Duplicate files')}</h3>
+% if duplicates['last_scan'] is None:
+<p>${_('Checking files present on multiple storage devices...')}</p>
+% elif not differing:
+<p>${_('{count} files are present on multiple storage devices, all copies are identical.').format(count=duplicates['total'])}</p>
+% else:
+<p>${_('{count} files are present on multiple storage devices, {differing} of them have copies that differ:').format(count=duplicates['total'], differing=len(differing))}</p>
+<ul class="ftp-duplicates">
+    % for collision in differing[:limit]:
+    <li>
+        <span class="ftp-duplicates-path">${collision.path}</span>
+        <ul>
+            % for copy in collision.copies:
+            <li${' class="ftp-duplicates-preferred"' if copy.index == collision.preferred else ''}>${basepaths[copy.index]} (${h.hsize(copy.size)})</li>
+            % endfor
+        </ul>
+    </li>
+    % endfor
+</ul>
+    % if len(differing) > limit:
+<p>${_('{count} more not shown.').format(count=len(differing) - limit)}</p>
+    % endif
+% endif
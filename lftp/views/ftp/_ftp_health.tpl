@@ -0,0 +1,13 @@
+<h3>${_('Storage status')}</h3>
+<ul class="ftp-health">
+    % for basepath in health:
+    <li class="${'ftp-health-ok' if basepath['available'] else 'ftp-health-down'}">
+        <span class="ftp-health-path">${basepath['path']}</span>
+        % if basepath['available']:
+        <span class="ftp-health-status">${_('responding ({latency} ms)').format(latency=int(basepath['latency'] * 1000))}</span>
+        % else:
+        <span class="ftp-health-status">${_('not responding, temporarily not in use')}</span>
+        % endif
+    </li>
+    % endfor
+</ul>
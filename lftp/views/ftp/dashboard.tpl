@@ -1,9 +1,17 @@
 <%namespace name="forms" file="/ui/forms.tpl"/>
 <%namespace name="ftp_settings_form" file="_ftp_settings_form.tpl"/>
+<%namespace name="ftp_health" file="_ftp_health.tpl"/>
+<%namespace name="ftp_duplicates" file="_ftp_duplicates.tpl"/>
 
 ${h.form('post', action=i18n_url('ftp:settings'), id="ftp-settings-form")}
     ${ftp_settings_form.body()}
 </form>
+% if health:
+    ${ftp_health.body()}
+% endif
+% if duplicates:
+    ${ftp_duplicates.body()}
+% endif
 <script type="text/template" id="ftpSettingsSaveError">
     <% 
     # Translators, error message when settings cannot be saved
@@ -0,0 +1,106 @@
+"""
+Memory benchmark for the per-user and per-session state of the FTP server.
+
+Reports the number of bytes allocated for each user added to FTPAuthorizer and
+for each UnifiedFilesystem instance, as measured by tracemalloc. As tracemalloc
+is only part of the standard library since Python 3.4, the benchmark has to be
+run with Python 3.
+
+Usage::
+
+    python3 scripts/membench.py [--users N] [--sessions N] [--basepaths N]
+"""
+
+from __future__ import print_function, unicode_literals
+
+import os
+import sys
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lftp.ftp.authorizer import FTPAuthorizer  # NOQA
+from lftp.ftp.filesystem import UnifiedFilesystem  # NOQA
+
+
+BLACKLIST = [
+    r'^\.Trash.*',
+    r'\.fseventsd',
+    r'\.Spotlight-V100',
+    r'.*/?\.DS_Store',
+    r'\._.*',
+    r'\.TemporaryItems',
+    r'\$RECYCLE\.BIN',
+    r'Recycler',
+    r'System Volume Information',
+    r'.*/?Thumbs\.db',
+    r'.*/?\.thumbs',
+    r'^lost\+found(\/.*)?$',
+]
+
+
+class CommandChannel(object):
+    """ Stand-in for the FTPHandler instance each filesystem belongs to """
+    use_gmt_times = True
+
+
+def measure(func, count):
+    """ Call `func` `count` times and return the bytes allocated per call """
+    objects = []
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for i in range(count):
+        objects.append(func(i))
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    stats = after.compare_to(before, 'filename')
+    allocated = sum(stat.size_diff for stat in stats)
+    # account for the list holding the created objects
+    allocated -= sys.getsizeof(objects)
+    return allocated / float(count)
+
+
+def bench_users(count, home):
+    authorizer = FTPAuthorizer()
+    # pbkdf2 hashes of the same length as the ones stored by librarian
+    password = '$p5k2$3e8$' + 'x' * 32
+
+    def add_user(i):
+        authorizer.add_user('user{}'.format(i), password, home,
+                            perm='elradfmw')
+    return measure(add_user, count)
+
+
+def bench_sessions(count, basepaths):
+    UnifiedFilesystem.configure(basepaths, blacklist=BLACKLIST)
+    channel = CommandChannel()
+
+    def create_session(i):
+        return UnifiedFilesystem(basepaths[0], channel)
+    return measure(create_session, count)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--sessions', type=int, default=1000)
+    parser.add_argument('--basepaths', type=int, default=3)
+    args = parser.parse_args()
+
+    basepaths = [tempfile.mkdtemp() for _ in range(args.basepaths)]
+    try:
+        per_user = bench_users(args.users, basepaths[0])
+        per_session = bench_sessions(args.sessions, basepaths)
+    finally:
+        for path in basepaths:
+            shutil.rmtree(path)
+    print('users:    {:>8} {:>10.1f} bytes/user'.format(args.users, per_user))
+    print('sessions: {:>8} {:>10.1f} bytes/session'.format(
+        args.sessions, per_session))
+
+
+if __name__ == '__main__':
+    main()
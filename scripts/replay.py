@@ -0,0 +1,382 @@
+"""
+Replay FTP sessions recorded by the command trace against a local server.
+
+The sessions found in the trace files (see the ``ftp.trace_log`` setting) are
+replayed against an LFTPServer instance started in a separate process, which
+serves a temporary tree spread over multiple basepaths. The tree contains the
+directories and files the recorded commands refer to.
+
+Reports the throughput, the latency percentiles of each command and the CPU
+time and peak RSS of the server.
+
+Usage::
+
+    python scripts/replay.py TRACE [TRACE ...] [--speed X] [--concurrency N]
+                             [--basepaths N] [--file-size BYTES]
+"""
+
+from __future__ import print_function, unicode_literals
+
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import ftplib
+import argparse
+import resource
+import tempfile
+import threading
+import posixpath
+import multiprocessing
+
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pbkdf2  # NOQA
+
+from lftp.ftpserver import LFTPServer  # NOQA
+
+
+USER = 'replay'
+PASSWORD = 'replay'
+
+# Commands which are not replayed, as the client issues them on its own
+SKIPPED = set(['USER', 'PASS', 'ACCT', 'PASV', 'EPSV', 'PORT', 'EPRT', 'REST',
+               'ABOR', 'REIN', 'QUIT'])
+LISTINGS = set(['LIST', 'NLST', 'MLSD'])
+DOWNLOADS = set(['RETR'])
+UPLOADS = set(['STOR', 'STOU', 'APPE'])
+# Commands whose argument is a path to an existing file or directory
+FILE_ARGS = set(['RETR', 'SIZE', 'MDTM', 'DELE', 'RNFR', 'MLST'])
+DIR_ARGS = set(['CWD', 'XCWD', 'RMD', 'XRMD'])
+CREATED_ARGS = set(['MKD', 'XMKD', 'RNTO']) | UPLOADS
+
+
+def load_trace(paths):
+    """
+    Return a list of sessions read from the trace files at `paths`, each
+    session being a list of records ordered by time.
+    """
+    sessions = defaultdict(list)
+    for path in paths:
+        with io.open(path, encoding='utf8') as f:
+            for line in f:
+                record = json.loads(line)
+                sessions[record['session']].append(record)
+    sessions = [sorted(records, key=lambda r: r['time'])
+                for records in sessions.values()]
+    return sorted(sessions, key=lambda records: records[0]['time'])
+
+
+def resolve(cwd, arg):
+    return posixpath.normpath(posixpath.join(cwd, arg))
+
+
+def collect_paths(sessions):
+    """
+    Return sets of the virtual directories and files the recorded commands
+    expect to exist, following the working directory of each session.
+    """
+    dirs = set()
+    files = set()
+    created = set()
+    for records in sessions:
+        cwd = '/'
+        for record in records:
+            cmd, arg = record['cmd'], record['arg'] or ''
+            if arg.startswith('-'):
+                # ls-like options passed to LIST
+                arg = ''
+            if cmd in ('CWD', 'XCWD') and arg:
+                cwd = resolve(cwd, arg)
+            elif cmd in ('CDUP', 'XCUP'):
+                cwd = posixpath.dirname(cwd)
+            if not arg:
+                continue
+            path = resolve(cwd, arg)
+            if cmd in CREATED_ARGS:
+                created.add(path)
+            elif cmd in DIR_ARGS or cmd in LISTINGS:
+                dirs.add(path)
+            elif cmd in FILE_ARGS:
+                files.add(path)
+    files -= dirs
+    # the parents of the created paths must exist for them to be created
+    for path in list(files) + list(dirs) + list(created):
+        dirs.update(parents(path))
+    # paths created by the sessions themselves must not exist up front, nor
+    # anything beneath them
+    dirs = set(path for path in dirs if not is_created(path, created))
+    files = set(path for path in files if not is_created(path, created))
+    dirs.discard('/')
+    return dirs, files
+
+
+def parents(path):
+    """ Return the list of parent directories of `path`, excluding the root """
+    result = []
+    parent = posixpath.dirname(path)
+    while parent not in ('/', ''):
+        result.append(parent)
+        parent = posixpath.dirname(parent)
+    return result
+
+
+def is_created(path, created):
+    """ Returns `True` if `path` or any of its parents are in `created` """
+    return path in created or any(p in created for p in parents(path))
+
+
+def build_tree(basepaths, dirs, files, file_size):
+    """
+    Create `dirs` under all `basepaths`, and distribute `files` of
+    `file_size` bytes over them.
+    """
+    payload = os.urandom(min(file_size, 1024 * 1024))
+    for basepath in basepaths:
+        for path in sorted(dirs):
+            os.makedirs(os.path.join(basepath, path.lstrip('/')))
+    for index, path in enumerate(sorted(files)):
+        basepath = basepaths[index % len(basepaths)]
+        with open(os.path.join(basepath, path.lstrip('/')), 'wb') as f:
+            remaining = file_size
+            while remaining > 0:
+                f.write(payload[:remaining])
+                remaining -= len(payload)
+
+
+def free_port():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+class ReplaySetup(dict):
+    """ In-memory stand-in for librarian's setup storage """
+
+    def append(self, data):
+        self.update(data)
+
+
+def run_server(basepaths, port, conn):
+    """
+    Run LFTPServer until anything is received on `conn`, then send back the
+    CPU time and peak RSS used by the server and its worker processes.
+    """
+    def add_user(handler):
+        handler.authorizer.add_user(USER, pbkdf2.crypt(PASSWORD),
+                                    basepaths[0], perm='elradfmw')
+
+    config = {
+        'ftp.port': port,
+        'ftp.basepaths': basepaths,
+        'ftp.chroot': '',
+    }
+    server = LFTPServer(config, ReplaySetup(), setup_hooks=(add_user,))
+    server.start()
+    conn.recv()
+    server.stop()
+    # wait for the teardown, which collects the worker processes
+    while server.ftp_server:
+        time.sleep(0.1)
+    usage = [resource.getrusage(who)
+             for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN)]
+    conn.send(dict(cpu=sum(u.ru_utime + u.ru_stime for u in usage),
+                   maxrss=max(u.ru_maxrss for u in usage)))
+
+
+def wait_for_port(port, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), 1).close()
+            return
+        except socket.error:
+            time.sleep(0.1)
+    raise RuntimeError('FTP server did not start on port {}'.format(port))
+
+
+class Results(object):
+    """ Thread-safe collector of command latencies and errors """
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.bytes = 0
+        self.lock = threading.Lock()
+
+    def add(self, cmd, latency, size=0, error=False):
+        with self.lock:
+            self.latencies[cmd].append(latency)
+            self.bytes += size
+            if error:
+                self.errors[cmd] += 1
+
+
+def execute(ftp, cmd, arg, upload):
+    """ Execute a recorded command, returning the number of bytes moved """
+    line = '{} {}'.format(cmd, arg).strip()
+    received = [0]
+
+    def count(data):
+        received[0] += len(data)
+
+    if cmd in LISTINGS:
+        ftp.retrlines(line, count)
+    elif cmd in DOWNLOADS:
+        ftp.retrbinary(line, count)
+    elif cmd in UPLOADS:
+        ftp.storbinary(line, io.BytesIO(upload))
+        return len(upload)
+    else:
+        ftp.sendcmd(line)
+    return received[0]
+
+
+def replay_session(records, port, speed, upload, results):
+    ftp = ftplib.FTP()
+    try:
+        ftp.connect('127.0.0.1', port)
+        ftp.login(USER, PASSWORD)
+    except ftplib.all_errors:
+        results.add('LOGIN', 0, error=True)
+        return
+    previous = records[0]['time']
+    try:
+        for record in records:
+            if speed:
+                time.sleep(max(0, record['time'] - previous) / speed)
+            previous = record['time']
+            cmd = record['cmd']
+            if cmd in SKIPPED:
+                continue
+            start = time.time()
+            try:
+                size = execute(ftp, cmd, record['arg'] or '', upload)
+            except ftplib.Error:
+                results.add(cmd, time.time() - start, error=True)
+            except (EOFError, socket.error):
+                results.add(cmd, time.time() - start, error=True)
+                return
+            else:
+                results.add(cmd, time.time() - start, size)
+        ftp.quit()
+    except ftplib.all_errors:
+        pass
+    finally:
+        ftp.close()
+
+
+def replay(sessions, port, speed, concurrency, upload):
+    """
+    Replay `sessions`, starting them at their recorded offsets scaled by
+    `speed`, with no more than `concurrency` of them running at once.
+    """
+    results = Results()
+    slots = threading.Semaphore(concurrency)
+    threads = []
+    start = time.time()
+    origin = sessions[0][0]['time'] if sessions else 0
+
+    def run(records):
+        try:
+            replay_session(records, port, speed, upload, results)
+        finally:
+            slots.release()
+
+    for records in sessions:
+        if speed:
+            delay = (records[0]['time'] - origin) / speed
+            time.sleep(max(0, start + delay - time.time()))
+        slots.acquire()
+        thread = threading.Thread(target=run, args=(records,))
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    return results, time.time() - start
+
+
+def percentile(values, pct):
+    """ Return the `pct` percentile of sorted `values` (nearest rank) """
+    index = max(0, int(round(pct / 100.0 * len(values))) - 1)
+    return values[min(index, len(values) - 1)]
+
+
+def report(results, elapsed, usage):
+    total = sum(len(v) for v in results.latencies.values())
+    print('commands:   {}'.format(total))
+    print('elapsed:    {:.2f} s'.format(elapsed))
+    print('throughput: {:.1f} commands/s, {:.1f} KiB/s'.format(
+        total / elapsed, results.bytes / 1024.0 / elapsed))
+    print('server:     {:.2f} s CPU, {} KiB peak RSS'.format(
+        usage['cpu'], usage['maxrss']))
+    print('')
+    print('{:<8} {:>8} {:>7} {:>9} {:>9} {:>9} {:>9}'.format(
+        'command', 'count', 'errors', 'p50 ms', 'p90 ms', 'p99 ms', 'max ms'))
+    rows = sorted(results.latencies.items())
+    all_latencies = [latency for _, latencies in rows
+                     for latency in latencies]
+    for cmd, latencies in rows + [('all', all_latencies)]:
+        latencies = sorted(latencies)
+        if not latencies:
+            continue
+        errors = (sum(results.errors.values()) if cmd == 'all'
+                  else results.errors[cmd])
+        print('{:<8} {:>8} {:>7} {:>9.2f} {:>9.2f} {:>9.2f} {:>9.2f}'.format(
+            cmd, len(latencies), errors,
+            *[percentile(latencies, p) * 1000 for p in (50, 90, 99, 100)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('traces', nargs='+', metavar='TRACE')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='replay speed factor, 0 for no delays '
+                             '(default: 1)')
+    parser.add_argument('--concurrency', type=int, default=50,
+                        help='maximum number of concurrent sessions '
+                             '(default: 50)')
+    parser.add_argument('--basepaths', type=int, default=3,
+                        help='number of basepaths (default: 3)')
+    parser.add_argument('--file-size', type=int, default=64 * 1024,
+                        help='size of the files downloaded and uploaded '
+                             '(default: 65536)')
+    args = parser.parse_args()
+
+    sessions = load_trace(args.traces)
+    tmpdir = tempfile.mkdtemp()
+    basepaths = [os.path.join(tmpdir, 'basepath{}'.format(i))
+                 for i in range(args.basepaths)]
+    for basepath in basepaths:
+        os.mkdir(basepath)
+    try:
+        build_tree(basepaths, *collect_paths(sessions),
+                   file_size=args.file_size)
+        port = free_port()
+        conn, server_conn = multiprocessing.Pipe()
+        server = multiprocessing.Process(target=run_server,
+                                         args=(basepaths, port, server_conn))
+        server.start()
+        try:
+            wait_for_port(port)
+            results, elapsed = replay(sessions, port, args.speed,
+                                      args.concurrency,
+                                      os.urandom(args.file_size))
+        finally:
+            conn.send('stop')
+            usage = conn.recv()
+            server.join()
+    finally:
+        shutil.rmtree(tmpdir)
+    report(results, elapsed, usage)
+
+
+if __name__ == '__main__':
+    main()
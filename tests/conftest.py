@@ -0,0 +1,23 @@
+import pytest
+
+from lftp.ftp.filesystem import UnifiedFilesystem
+
+
+@pytest.fixture
+def basepaths(tmpdir):
+    paths = []
+    for name in ('a', 'b'):
+        path = tmpdir.mkdir(name)
+        path.mkdir('docs')
+        paths.append(str(path))
+    return paths
+
+
+@pytest.fixture
+def make_fs():
+    def make_fs(basepaths, **kwargs):
+        # configure a subclass, as the configuration is stored on the class
+        cls = type(str('FS'), (UnifiedFilesystem,), {})
+        cls.configure(basepaths, **kwargs)
+        return cls('/', None)
+    return make_fs
@@ -0,0 +1,75 @@
+import os
+
+import pytest
+
+from lftp.ftp import authorizer as mod
+
+
+@pytest.fixture
+def authorizer(tmpdir):
+    tmpdir.mkdir('docs')
+    authorizer = mod.FTPAuthorizer()
+    authorizer.add_user('alice', 'secret', str(tmpdir), perm='elr')
+    authorizer.add_user('bob', 'secret', str(tmpdir), perm='elr')
+    return authorizer
+
+
+def test_user_record_item_access(authorizer, tmpdir):
+    user = authorizer.user_table['alice']
+    assert user['home'] == os.path.realpath(str(tmpdir))
+    assert 'msg_login' in user
+    assert 'other' not in user
+    with pytest.raises(KeyError):
+        user['other']
+    user['perm'] = 'elradfmw'
+    assert authorizer.get_perms('alice') == 'elradfmw'
+
+
+def test_values_are_shared(authorizer):
+    alice = authorizer.user_table['alice']
+    bob = authorizer.user_table['bob']
+    assert alice.home is bob.home
+    assert alice.perm is bob.perm
+    assert alice.operms is bob.operms is mod.NO_OPERMS
+
+
+def test_get_perms(authorizer):
+    assert authorizer.get_perms('alice') == 'elr'
+    assert authorizer.get_msg_login('alice') == 'Login successful.'
+
+
+def test_has_perm_with_overrides(authorizer, tmpdir):
+    docs = os.path.realpath(str(tmpdir.join('docs')))
+    assert not authorizer.has_perm('alice', 'w', docs)
+    authorizer.override_perm('alice', docs, 'elrw', recursive=True)
+    assert authorizer.has_perm('alice', 'w', docs)
+    assert authorizer.has_perm('alice', 'w', os.path.join(docs, 'f.txt'))
+    assert not authorizer.has_perm('alice', 'w')
+    assert not authorizer.has_perm('bob', 'w', docs)
+
+
+def test_override_perm_replaces_shared_overrides(authorizer, tmpdir):
+    docs = os.path.realpath(str(tmpdir.join('docs')))
+    authorizer.override_perm('alice', docs, 'elrw')
+    alice = authorizer.user_table['alice']
+    assert alice.operms is not mod.NO_OPERMS
+    assert alice.operms[docs] == ('elrw', False)
+    assert len(mod.NO_OPERMS) == 0
+    assert authorizer.user_table['bob'].operms is mod.NO_OPERMS
+
+
+def test_shared_overrides_are_read_only():
+    with pytest.raises(TypeError):
+        mod.NO_OPERMS['/'] = ('elr', False)
+    for method in ('update', 'setdefault', 'pop', 'popitem', 'clear'):
+        assert not hasattr(mod.NO_OPERMS, method)
+    assert dict(mod.NO_OPERMS) == {}
+
+
+def test_authentication(authorizer):
+    authorizer.user_table['alice'].pwd = mod.pbkdf2.crypt('secret')
+    authorizer.validate_authentication('alice', 'secret', None)
+    with pytest.raises(mod.AuthenticationFailed):
+        authorizer.validate_authentication('alice', 'wrong', None)
+    with pytest.raises(mod.AuthenticationFailed):
+        authorizer.validate_authentication('anonymous', '', None)
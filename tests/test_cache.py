@@ -0,0 +1,121 @@
+import os
+import time
+
+import mock
+
+from lftp.ftp import cache as mod
+
+
+def make_stat(ino=1, size=10, mtime=1000.5):
+    return os.stat_result((0o100644, ino, 2, 1, 0, 0, size, mtime, mtime,
+                           mtime))
+
+
+def test_get_set():
+    cache = mod.SharedPathCache(slots=16)
+    assert cache.get('a/b') is None
+    cache.set('a/b', 1, make_stat())
+    index, st = cache.get('a/b')
+    assert index == 1
+    assert st.st_size == 10
+    assert st.st_mtime == 1000.5
+
+
+def test_missing_path():
+    cache = mod.SharedPathCache(slots=16)
+    cache.set('a/b', mod.MISSING)
+    assert cache.get('a/b') == (mod.MISSING, None)
+
+
+def test_large_inode_numbers():
+    cache = mod.SharedPathCache(slots=16)
+    cache.set('a', 0, make_stat(ino=2 ** 64 - 1))
+    assert cache.get('a')[1].st_ino == 2 ** 64 - 1
+
+
+def test_values_which_do_not_fit_are_not_stored():
+    cache = mod.SharedPathCache(slots=16)
+    cache.set('a', 0, make_stat(size=1))
+    cache.set('a', 0, make_stat(size=-1))
+    assert cache.get('a')[1].st_size == 1
+    cache.set('b', 0, make_stat(ino=2 ** 64))
+    assert cache.get('b') is None
+
+
+def test_long_keys_are_not_stored():
+    cache = mod.SharedPathCache(slots=16)
+    key = 'a' * (mod.MAX_KEY_LENGTH + 1)
+    cache.set(key, 0, make_stat())
+    assert cache.get(key) is None
+
+
+def test_colliding_keys():
+    cache = mod.SharedPathCache(slots=1)
+    cache.set('a', 0, make_stat())
+    cache.set('b', 1, make_stat())
+    assert cache.get('a') is None
+    assert cache.get('b')[0] == 1
+
+
+def test_expiry():
+    cache = mod.SharedPathCache(slots=16, ttl=5)
+    cache.set('a', 0, make_stat())
+    with mock.patch.object(mod.time, 'time', return_value=time.time() + 6):
+        assert cache.get('a') is None
+
+
+def test_invalidate():
+    cache = mod.SharedPathCache(slots=16)
+    cache.set('a', 0, make_stat())
+    cache.set('b', 0, make_stat())
+    cache.invalidate('a')
+    assert cache.get('a') is None
+    assert cache.get('b') is not None
+    cache.invalidate()
+    assert cache.get('b') is None
+    cache.set('b', 0, make_stat())
+    assert cache.get('b') is not None
+
+
+def test_slot_being_written_is_a_miss():
+    cache = mod.SharedPathCache(slots=1)
+    cache.set('a', 0, make_stat())
+    offset = cache._offset(b'a')
+    seq = mod.SEQUENCE.unpack_from(cache._mm, offset)[0]
+    mod.SEQUENCE.pack_into(cache._mm, offset, seq + 1)
+    assert cache.get('a') is None
+    mod.SEQUENCE.pack_into(cache._mm, offset, seq + 2)
+    assert cache.get('a') is not None
+
+
+def test_shared_with_forked_processes():
+    cache = mod.SharedPathCache(slots=16)
+    pid = os.fork()
+    if pid == 0:
+        cache.set('a', 1, make_stat())
+        os._exit(0)
+    os.waitpid(pid, 0)
+    assert cache.get('a')[0] == 1
+
+
+def test_reads_never_see_partial_writes():
+    cache = mod.SharedPathCache(slots=1)
+    cache.set('a', 0, make_stat(ino=1, size=1, mtime=1))
+    pid = os.fork()
+    if pid == 0:
+        # the writer keeps the three fields of the entry equal to each other
+        deadline = time.time() + 0.5
+        value = 1
+        while time.time() < deadline:
+            value += 1
+            cache.set('a', 0, make_stat(ino=value, size=value, mtime=value))
+        os._exit(0)
+    reads = 0
+    while not os.waitpid(pid, os.WNOHANG)[0]:
+        cached = cache.get('a')
+        if cached is None:
+            continue
+        st = cached[1]
+        assert st.st_ino == st.st_size == st.st_mtime
+        reads += 1
+    assert reads > 0
@@ -0,0 +1,56 @@
+import os
+import threading
+
+import mock
+
+from lftp.control.commands import CommandHandler, query
+from lftp.control.server import ControlServer
+
+
+def serve_once(server):
+    sock = server.prepare_socket()
+
+    def accept():
+        try:
+            client, address = sock.accept()
+            server.request_handler(client, address)
+            client.close()
+        finally:
+            sock.close()
+
+    thread = threading.Thread(target=accept)
+    thread.daemon = True
+    thread.start()
+    return thread
+
+
+def test_query_transfer_stats(tmpdir):
+    ftp_server = mock.Mock()
+    ftp_server.transfer_stats.return_value = dict(transfers=3)
+    path = os.path.join(str(tmpdir), 'control.sock')
+    server = ControlServer({}, CommandHandler(ftp_server), socket_path=path)
+    thread = serve_once(server)
+    response = query(path, 'transfer_stats', window=60)
+    thread.join(1)
+    assert response == dict(result=dict(transfers=3))
+    ftp_server.transfer_stats.assert_called_once_with(60)
+
+
+def test_unknown_command():
+    handler = CommandHandler(mock.Mock())
+    assert handler(dict(name='reboot')) == dict(
+        error='Unknown command reboot')
+
+
+def test_invalid_arguments():
+    handler = CommandHandler(mock.Mock())
+    response = handler(dict(name='transfer_stats', args=dict(size=1)))
+    assert response['error'].startswith('Invalid arguments: ')
+
+
+def test_transfer_stats_default_window():
+    ftp_server = mock.Mock()
+    ftp_server.transfer_stats.return_value = None
+    handler = CommandHandler(ftp_server)
+    assert handler(dict(name='transfer_stats')) == dict(result=None)
+    ftp_server.transfer_stats.assert_called_once_with(300)
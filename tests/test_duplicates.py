@@ -0,0 +1,139 @@
+import os
+import time
+import threading
+
+import mock
+import pytest
+
+from lftp.ftp import duplicates as mod
+from lftp.ftp.health import BasepathHealth
+
+
+def write(path, data, mtime=None):
+    with open(path, 'wb') as f:
+        f.write(data)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+def copy(index, size=10, mtime=1000, digest='x'):
+    return mod.Copy(index, size, mtime, digest)
+
+
+def test_choose_newest():
+    index = mod.DuplicateIndex(mod.NEWEST)
+    assert index.choose([copy(0, mtime=1000), copy(1, mtime=2000)]) == 1
+
+
+def test_choose_fastest_identical_copies():
+    index = mod.DuplicateIndex(mod.FASTEST)
+    index.read_speed = {0: 100, 1: 10}
+    assert index.choose([copy(0, mtime=1000), copy(1, mtime=2000)]) == 0
+
+
+def test_choose_fastest_falls_back_to_newest_if_copies_differ():
+    index = mod.DuplicateIndex(mod.FASTEST)
+    index.read_speed = {0: 100, 1: 10}
+    copies = [copy(0, mtime=1000, digest='a'), copy(1, mtime=2000)]
+    assert index.choose(copies) == 1
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        mod.DuplicateIndex('random')
+
+
+def test_scan_finds_collisions(basepaths):
+    write(os.path.join(basepaths[0], 'docs', 'same.txt'), b'data', 1000)
+    write(os.path.join(basepaths[1], 'docs', 'same.txt'), b'data', 2000)
+    write(os.path.join(basepaths[0], 'docs', 'other.txt'), b'data')
+    write(os.path.join(basepaths[1], 'docs', 'other.txt'), b'more data')
+    write(os.path.join(basepaths[0], 'docs', 'single.txt'), b'data')
+    write(os.path.join(basepaths[0], 'docs', 'skipped.txt'), b'data')
+    write(os.path.join(basepaths[1], 'docs', 'skipped.txt'), b'data')
+    index = mod.DuplicateIndex(mod.NEWEST)
+    scanner = mod.DuplicateScanner(
+        basepaths, index, is_blacklisted=lambda p: p.endswith('skipped.txt'))
+    scanner.scan()
+    same = os.path.join('docs', 'same.txt')
+    other = os.path.join('docs', 'other.txt')
+    assert sorted(index.collisions) == sorted([same, other])
+    assert index.collisions[same].identical
+    assert index.preferred(same) == 1
+    assert not index.collisions[other].identical
+    assert index.preferred(os.path.join('docs', 'single.txt')) is None
+    assert index.report()['differing'] == [index.collisions[other]]
+    assert index.last_scan is not None
+
+
+def test_fingerprint_reuses_digests_of_unchanged_copies(basepaths):
+    for basepath in basepaths:
+        write(os.path.join(basepath, 'f.txt'), b'data', 1000)
+    scanner = mod.DuplicateScanner(basepaths, mod.DuplicateIndex())
+    scanner.scan()
+    digests = [c.digest for c in scanner.index.collisions['f.txt'].copies]
+    assert None not in digests
+    with mock.patch.object(mod, 'sample_digest') as sample_digest:
+        scanner.scan()
+    assert not sample_digest.called
+    copies = scanner.index.collisions['f.txt'].copies
+    assert [c.digest for c in copies] == digests
+
+
+def test_fingerprint_skips_hashing_copies_of_different_sizes(basepaths):
+    write(os.path.join(basepaths[0], 'f.txt'), b'data')
+    write(os.path.join(basepaths[1], 'f.txt'), b'other data')
+    scanner = mod.DuplicateScanner(basepaths, mod.DuplicateIndex())
+    found = [(i, os.stat(os.path.join(p, 'f.txt')))
+             for i, p in enumerate(basepaths)]
+    with mock.patch.object(mod, 'sample_digest') as sample_digest:
+        collision = scanner.fingerprint('f.txt', found)
+    assert not sample_digest.called
+    assert not collision.identical
+    assert [c.digest for c in collision.copies] == [None, None]
+
+
+def test_sample_digest_covers_whole_file(tmpdir):
+    size = 4 * mod.SAMPLE_SIZE
+    path = str(tmpdir.join('f.bin'))
+    write(path, b'\0' * size)
+    digest = mod.sample_digest(path, size)
+    write(path, b'\0' * (size - 1) + b'\1')
+    assert mod.sample_digest(path, size) != digest
+
+
+def test_resolve_serves_preferred_copy(basepaths, make_fs):
+    write(os.path.join(basepaths[0], 'docs', 'f.txt'), b'old', 1000)
+    write(os.path.join(basepaths[1], 'docs', 'f.txt'), b'new', 2000)
+    index = mod.DuplicateIndex(mod.NEWEST)
+    fs = make_fs(basepaths, duplicates=index)
+    assert fs.resolve('docs/f.txt')[0] == 0
+    mod.DuplicateScanner(basepaths, index).scan()
+    assert fs.resolve('docs/f.txt')[0] == 1
+    with fs.open('docs/f.txt', 'rb') as f:
+        assert f.read() == b'new'
+
+
+def test_scan_skips_hanging_basepath(basepaths):
+    health = BasepathHealth(basepaths, timeout=0.2, cooldown=30)
+    for basepath in basepaths:
+        write(os.path.join(basepath, 'docs', 'f.txt'), b'data')
+    release = threading.Event()
+    index = mod.DuplicateIndex()
+    scanner = mod.DuplicateScanner(basepaths, index, health=health)
+
+    def hang(*args):
+        release.wait()
+
+    def run(index, func, *args):
+        if index == 1 and func is os.listdir:
+            func = hang
+        return BasepathHealth.run(health, index, func, *args)
+
+    start = time.time()
+    with mock.patch.object(health, 'run', side_effect=run):
+        scanner.scan()
+    release.set()
+    assert time.time() - start < 1
+    assert index.collisions == {}
+    assert not health.available(1)
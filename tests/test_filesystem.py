@@ -0,0 +1,185 @@
+import os
+import time
+import errno
+import threading
+
+import mock
+import pytest
+
+from lftp.ftp import filesystem as mod
+from lftp.ftp.cache import SharedPathCache
+from lftp.ftp.health import BasepathHealth
+
+
+@pytest.fixture
+def health(basepaths):
+    health = BasepathHealth(basepaths, timeout=0.2, cooldown=30)
+    yield health
+    # let the operations left hanging by the tests return
+    time.sleep(0.3)
+
+
+def test_new_files_avoid_unavailable_basepath(basepaths, health, make_fs):
+    fs = make_fs(basepaths, health=health)
+    health.trip(1)
+    f = fs.open('docs/new.txt', 'wb')
+    f.write(b'data')
+    fs.publish_upload(f)
+    assert f.name == os.path.join(basepaths[0], 'docs', 'new.txt')
+    assert os.path.isfile(f.name)
+    fs.mkdir('docs/sub')
+    assert os.path.isdir(os.path.join(basepaths[0], 'docs', 'sub'))
+
+
+def test_new_files_fail_without_available_basepath(basepaths, health, make_fs):
+    fs = make_fs(basepaths, health=health)
+    health.trip(0)
+    health.trip(1)
+    with pytest.raises(OSError) as exc:
+        fs.mkdir('docs/sub')
+    assert exc.value.errno == errno.ETIMEDOUT
+
+
+def test_lstat_times_out(basepaths, health, make_fs):
+    fs = make_fs(basepaths, health=health)
+    open(os.path.join(basepaths[0], 'docs', 'f.txt'), 'w').close()
+    release = threading.Event()
+
+    def hang(*args):
+        release.wait()
+
+    def run(index, func, *args):
+        if func is os.lstat:
+            func = hang
+        return BasepathHealth.run(health, index, func, *args)
+
+    start = time.time()
+    with mock.patch.object(health, 'run', side_effect=run):
+        with pytest.raises(OSError) as exc:
+            fs.lstat('docs/f.txt')
+    release.set()
+    assert exc.value.errno == errno.ETIMEDOUT
+    assert time.time() - start < 1
+    assert not health.available(0)
+
+
+def test_listing_skips_basepath_hanging_while_read(basepaths, health, make_fs):
+    fs = make_fs(basepaths, health=health)
+    for index, name in ((0, 'x'), (1, 'y')):
+        for i in range(mod.READ_CHUNK + 1):
+            path = os.path.join(basepaths[index], 'docs',
+                                '{}{}'.format(name, i))
+            open(path, 'w').close()
+    release = threading.Event()
+    read_chunk = mod.read_chunk
+    calls = []
+
+    def hanging_read_chunk(iterator, size):
+        calls.append(size)
+        if len(calls) == 2:
+            # the second chunk of the first basepath never arrives
+            release.wait()
+        return read_chunk(iterator, size)
+
+    start = time.time()
+    with mock.patch.object(mod, 'read_chunk', hanging_read_chunk):
+        names = list(fs.iterdir('docs'))
+    release.set()
+    assert time.time() - start < 2
+    assert len([n for n in names if n.startswith('x')]) == mod.READ_CHUNK
+    assert len([n for n in names if n.startswith('y')]) == mod.READ_CHUNK + 1
+    assert not health.available(0)
+    assert health.available(1)
+
+
+def test_basepath_prefix_of_another(tmpdir, make_fs):
+    sda1 = str(tmpdir.mkdir('sda1'))
+    sda10 = str(tmpdir.mkdir('sda10'))
+    fs = make_fs([sda1, sda10])
+    path = os.path.join(sda10, 'x')
+    assert fs.get_basepath(path) == sda10
+    assert fs.get_virtual_path(path) == 'x'
+    assert fs.get_basepath(sda1) == sda1
+    assert fs.get_virtual_path(sda1) == fs.VIRTUAL_ROOT
+
+
+def test_append_copy_times_out(basepaths, health, make_fs):
+    fs = make_fs(basepaths, health=health)
+    open(os.path.join(basepaths[0], 'docs', 'f.txt'), 'w').close()
+    release = threading.Event()
+
+    def hang(*args):
+        release.wait()
+
+    def run(index, func, *args):
+        if func is open:
+            func = hang
+        return BasepathHealth.run(health, index, func, *args)
+
+    start = time.time()
+    with mock.patch.object(health, 'run', side_effect=run):
+        with pytest.raises(OSError) as exc:
+            fs.open('docs/f.txt', 'ab')
+    release.set()
+    assert exc.value.errno == errno.ETIMEDOUT
+    assert time.time() - start < 1
+
+
+def test_publish_does_not_wait_for_hanging_fsync(basepaths, health, make_fs):
+    fs = make_fs(basepaths, health=health)
+    release = threading.Event()
+
+    def hang(*args):
+        release.wait()
+
+    def run(index, func, *args):
+        if func is mod.fsync_dir:
+            func = hang
+        return BasepathHealth.run(health, index, func, *args)
+
+    f = fs.open('docs/new.txt', 'wb')
+    f.write(b'data')
+    start = time.time()
+    with mock.patch.object(health, 'run', side_effect=run):
+        fs.publish_upload(f)
+    release.set()
+    assert time.time() - start < 1
+    assert os.path.isfile(f.name)
+    assert f.closed
+
+
+def test_outside_change_to_file_invalidates_it(basepaths, make_fs):
+    cache = SharedPathCache(slots=64)
+    fs = make_fs(basepaths, cache=cache)
+    path = os.path.join(basepaths[0], 'docs', 'f.txt')
+    open(path, 'w').close()
+    assert fs.getsize('docs/f.txt') == 0
+    assert fs.isdir('docs')
+    assert not fs.isfile('docs/other.txt')
+    with open(path, 'w') as f:
+        f.write('data')
+    fs.invalidate_cached('docs/f.txt')
+    assert cache.get('docs/f.txt') is None
+    assert cache.get('docs') is None
+    assert cache.get('docs/other.txt') is not None
+    assert fs.getsize('docs/f.txt') == 4
+
+
+def test_outside_change_to_directory_invalidates_all(basepaths, make_fs):
+    cache = SharedPathCache(slots=64)
+    fs = make_fs(basepaths, cache=cache)
+    assert not fs.isfile('docs/new/f.txt')
+    fs.invalidate_cached('docs/new')
+    assert cache.get('docs/new/f.txt') is None
+
+
+def test_lstat_is_not_cached(basepaths, make_fs):
+    cache = SharedPathCache(slots=64)
+    fs = make_fs(basepaths, cache=cache)
+    path = os.path.join(basepaths[1], 'docs', 'f.txt')
+    open(path, 'w').close()
+    assert fs.lstat('docs/f.txt').st_ino == os.stat(path).st_ino
+    assert cache.get('docs/f.txt') is None
+    with pytest.raises(OSError) as exc:
+        fs.lstat('docs/missing.txt')
+    assert exc.value.errno == errno.ENOENT
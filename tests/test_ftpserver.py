@@ -0,0 +1,36 @@
+import mock
+
+from lftp.ftpserver import LFTPServer
+
+
+def make_server(basepaths, chroot=None):
+    config = {'ftp.basepaths': basepaths, 'ftp.chroot': chroot}
+    return LFTPServer(config, mock.Mock())
+
+
+def test_virtual_path_of_absolute_path():
+    server = make_server(['/mnt/a', '/mnt/b'], chroot='guest/data/')
+    assert server.get_virtual_path('/mnt/b/guest/data/x/y') == 'x/y'
+    assert server.get_virtual_path('/mnt/b/guest/data') == '.'
+    assert server.get_virtual_path('/mnt/b/guest/other') is None
+    assert server.get_virtual_path('/mnt/c/guest/data/x') is None
+
+
+def test_virtual_path_of_relative_path():
+    server = make_server(['/mnt/a'], chroot='guest/data/')
+    assert server.get_virtual_path('guest/data/x') == 'x'
+    assert server.get_virtual_path('guest/x') is None
+    assert make_server(['/mnt/a']).get_virtual_path('x/./y') == 'x/y'
+
+
+def test_invalidate_cache():
+    server = make_server(['/mnt/a'], chroot='guest')
+    server.ftp_server = mock.Mock()
+    fs = server.ftp_server.handler.abstracted_fs
+    server.invalidate_cache('/mnt/a/guest/x')
+    fs.invalidate_cached.assert_called_once_with('x')
+    server.invalidate_cache()
+    fs.invalidate_cached.assert_called_with(None)
+    fs.invalidate_cached.reset_mock()
+    server.invalidate_cache('/mnt/a/other')
+    assert not fs.invalidate_cached.called
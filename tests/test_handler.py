@@ -0,0 +1,67 @@
+import os
+
+import mock
+
+from lftp.ftp.handler import LFTPHandler
+
+
+def make_handler(fs):
+    handler = LFTPHandler.__new__(LFTPHandler)
+    handler.fs = fs
+    handler.authorizer = mock.Mock()
+    handler.username = handler.password = 'user'
+    handler._current_type = 'i'
+    handler.respond = mock.Mock()
+    return handler
+
+
+def test_size_of_interrupted_upload(basepaths, make_fs):
+    fs = make_fs(basepaths)
+    f = fs.open('docs/new.txt', 'wb')
+    f.write(b'x' * 42)
+    f.close()
+    fs.abandon_upload(f.name)
+    handler = make_handler(fs)
+    handler.ftp_SIZE(f.name)
+    handler.respond.assert_called_once_with('213 42')
+
+
+def test_size_of_file(basepaths, make_fs):
+    path = os.path.join(basepaths[0], 'docs', 'f.txt')
+    with open(path, 'wb') as f:
+        f.write(b'x' * 7)
+    handler = make_handler(make_fs(basepaths))
+    handler.ftp_SIZE(path)
+    handler.respond.assert_called_once_with('213 7')
+
+
+def test_size_of_missing_file(basepaths, make_fs):
+    handler = make_handler(make_fs(basepaths))
+    handler.ftp_SIZE(os.path.join(basepaths[0], 'docs', 'missing.txt'))
+    assert handler.respond.call_args[0][0].startswith('550 ')
+
+
+def test_resume_over_complete_file(basepaths, make_fs):
+    path = os.path.join(basepaths[0], 'docs', 'f.txt')
+    with open(path, 'wb') as f:
+        f.write(b'x' * 1000)
+    fs = make_fs(basepaths)
+    f = fs.open('docs/f.txt', 'wb')
+    f.write(b'y' * 300)
+    f.close()
+    fs.abandon_upload(f.name)
+    handler = make_handler(fs)
+    handler.data_channel = None
+    handler.ftp_SIZE(path)
+    handler.respond.assert_called_once_with('213 300')
+    handler._restart_position = 1000
+    handler.ftp_STOR(path)
+    handler.respond.assert_called_with(
+        '554 REST position (1000) > file size (300)')
+    handler._restart_position = 300
+    assert handler.ftp_STOR(path) == path
+    fd, _ = handler._in_dtp_queue
+    fd.write(b'y' * 700)
+    fs.publish_upload(fd)
+    with open(path, 'rb') as f:
+        assert f.read() == b'y' * 1000
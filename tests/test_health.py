@@ -0,0 +1,93 @@
+import os
+import time
+import errno
+import threading
+
+import pytest
+
+from lftp.ftp.health import BasepathHealth
+
+
+@pytest.fixture
+def release():
+    event = threading.Event()
+    yield event
+    event.set()
+
+
+def hang(event):
+    return lambda *args: event.wait()
+
+
+def test_run_times_out_and_trips(tmpdir, release):
+    health = BasepathHealth([str(tmpdir)], timeout=0.1, cooldown=30)
+    with pytest.raises(OSError) as exc:
+        health.run(0, hang(release))
+    assert exc.value.errno == errno.ETIMEDOUT
+    assert not health.available(0)
+    # calls fail fast while the circuit is open
+    start = time.time()
+    with pytest.raises(OSError):
+        health.run(0, lambda: None)
+    assert time.time() - start < 0.1
+    assert health.status()[0]['failures'] == 1
+
+
+def test_stuck_operation_keeps_basepath_down(tmpdir, release):
+    health = BasepathHealth([str(tmpdir)], timeout=0.1, cooldown=0)
+    with pytest.raises(OSError):
+        health.run(0, hang(release))
+    # the cooldown is over, but the operation did not return yet
+    assert not health.available(0)
+    assert not health.probe(0)
+    release.set()
+    time.sleep(0.1)
+    assert health.available(0)
+
+
+def test_probe_extends_cooldown_while_stuck(tmpdir, release):
+    health = BasepathHealth([str(tmpdir)], timeout=0.1, cooldown=0.2)
+    with pytest.raises(OSError):
+        health.run(0, hang(release))
+    time.sleep(0.3)
+    # the cooldown is over, but the operation did not return yet
+    assert not health.probe(0)
+    assert health._down_until[0] > time.time()
+    # other processes keep skipping the basepath
+    health._stuck.clear()
+    assert not health.available(0)
+
+
+def test_probe_does_not_end_cooldown_early(tmpdir):
+    health = BasepathHealth([str(tmpdir)], timeout=0.5, cooldown=30)
+    health.trip(0)
+    assert health.probe(0)
+    assert not health.available(0)
+
+
+def test_probe_closes_circuit_after_cooldown(tmpdir):
+    health = BasepathHealth([str(tmpdir)], timeout=0.5, cooldown=0.1)
+    health.trip(0)
+    time.sleep(0.2)
+    assert health.probe(0)
+    assert health.available(0)
+    assert health.status()[0]['failures'] == 0
+
+
+def test_trip_is_shared_with_forked_processes(tmpdir):
+    health = BasepathHealth([str(tmpdir), str(tmpdir)], timeout=0.5,
+                            cooldown=30)
+    # worker processes are forked like this by MultiprocessFTPServer
+    pid = os.fork()
+    if pid == 0:
+        health.trip(1)
+        os._exit(0)
+    os.waitpid(pid, 0)
+    assert health.available(0)
+    assert not health.available(1)
+
+
+def test_no_timeout_runs_directly(tmpdir):
+    health = BasepathHealth([str(tmpdir)], timeout=0)
+    thread = health.run(0, threading.current_thread)
+    assert thread is threading.current_thread()
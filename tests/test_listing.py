@@ -0,0 +1,65 @@
+import collections
+import threading
+
+import mock
+
+from lftp.ftp.handler import LFTPDTPHandler
+from lftp.ftp.listing import ListingProducer
+from lftp.utils.pool import get_pool
+
+
+def lines(count):
+    return iter(['{}\r\n'.format(i).encode('ascii') for i in range(count)])
+
+
+def test_batches():
+    producer = ListingProducer(lines(5), batch_size=2)
+    assert producer.more() == b'0\r\n1\r\n'
+    assert producer.more() == b'2\r\n3\r\n'
+    assert producer.more() == b'4\r\n'
+    assert producer.more() == b''
+
+
+def test_next_batch_read_on_pool():
+    release = threading.Event()
+    entries = lines(4)
+
+    def slow_lines():
+        yield next(entries)
+        release.wait()
+        for line in entries:
+            yield line
+
+    producer = ListingProducer(slow_lines(), batch_size=1,
+                               pool=get_pool('test', 1))
+    assert producer.more() == b'0\r\n'
+    assert not producer.ready()
+    release.set()
+    assert producer.more() == b'1\r\n'
+    assert producer.more() == b'2\r\n'
+
+
+def make_dtp(producer):
+    dtp = LFTPDTPHandler.__new__(LFTPDTPHandler)
+    dtp.producer_fifo = collections.deque([producer])
+    dtp.ioloop = mock.Mock()
+    dtp.modify_ioloop_events = mock.Mock()
+    return dtp
+
+
+def test_data_channel_waits_for_producer():
+    producer = mock.Mock()
+    producer.ready.return_value = False
+    dtp = make_dtp(producer)
+    with mock.patch('pyftpdlib.handlers.DTPHandler.initiate_send') as send:
+        dtp.initiate_send()
+        dtp.initiate_send()
+        assert not send.called
+        assert not producer.more.called
+        dtp.modify_ioloop_events.assert_called_with(0)
+        # a single check is scheduled
+        assert dtp.ioloop.call_later.call_count == 1
+        producer.ready.return_value = True
+        dtp.resume_send()
+        send.assert_called_once_with(dtp)
+        dtp.modify_ioloop_events.assert_called_with(dtp.ioloop.WRITE)
@@ -0,0 +1,105 @@
+import os
+import json
+import time
+
+from lftp.ftp.records import RecordLog
+from lftp.ftp.transfers import TransferLog
+
+
+def read_records(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_records_written_in_background(tmpdir):
+    path = str(tmpdir.join('records.jsonl'))
+    log = RecordLog(path, flush_interval=0.05)
+    log.start()
+    try:
+        log.put(dict(n=1))
+        log.put(dict(n=2))
+        deadline = time.time() + 2
+        while len(log.recent_records()) < 2 and time.time() < deadline:
+            time.sleep(0.01)
+    finally:
+        log.stop()
+    assert log.recent_records() == [dict(n=1), dict(n=2)]
+    assert read_records(path) == [dict(n=1), dict(n=2)]
+
+
+def test_full_queue_drops_records(tmpdir):
+    log = RecordLog(str(tmpdir.join('records.jsonl')), queue_size=1)
+    log.put(dict(n=1))
+    log.put(dict(n=2))
+    log.put(dict(n=3))
+    assert log.dropped == 2
+
+
+def test_rotation_keeps_backups(tmpdir):
+    path = str(tmpdir.join('records.jsonl'))
+    log = RecordLog(path, max_size=1, backups=2)
+    for n in range(3):
+        log._flush([dict(n=n)])
+    assert not os.path.exists(path)
+    assert read_records(path + '.1') == [dict(n=2)]
+    assert read_records(path + '.2') == [dict(n=1)]
+    assert not os.path.exists(path + '.3')
+
+
+def test_rotation_without_backups(tmpdir):
+    path = str(tmpdir.join('records.jsonl'))
+    log = RecordLog(path, max_size=15, backups=0)
+    log._flush([dict(n=1)])
+    assert read_records(path) == [dict(n=1)]
+    log._flush([dict(n=2)])
+    assert not os.path.exists(path)
+    assert os.listdir(str(tmpdir)) == []
+
+
+def test_transfer_record(tmpdir):
+    log = TransferLog(str(tmpdir.join('transfers.jsonl')))
+    log.record('user', 'RETR', 'docs/f.txt', '/a', 10, 0.5, True, False)
+    entry = log._queue.get(timeout=1)
+    assert entry['path'] == 'docs/f.txt'
+    assert entry['result'] == 'completed'
+    assert entry['direction'] == 'download'
+
+
+def transfer(user, basepath, bytes, duration, completed=True,
+             direction='download', age=0):
+    return dict(time=time.time() - age, user=user, cmd='RETR',
+                path='f.txt', basepath=basepath, bytes=bytes,
+                duration=duration,
+                result='completed' if completed else 'incomplete',
+                direction=direction)
+
+
+def test_aggregate(tmpdir):
+    log = TransferLog(str(tmpdir.join('transfers.jsonl')))
+    log._flush([
+        transfer('alice', '/a', 100, 1.0),
+        transfer('bob', '/b', 300, 1.0, completed=False,
+                 direction='upload'),
+        # outside the window
+        transfer('alice', '/a', 1000, 1.0, age=600),
+    ])
+    stats = log.aggregate(window=300)
+    assert stats['window'] == 300
+    assert stats['dropped'] == 0
+    assert stats['transfers'] == 2
+    assert stats['incomplete'] == 1
+    assert stats['uploaded'] == 300
+    assert stats['downloaded'] == 100
+    assert stats['throughput'] == 200
+    assert stats['users']['alice']['downloaded'] == 100
+    assert stats['users']['bob']['incomplete'] == 1
+    assert stats['basepaths']['/b']['uploaded'] == 300
+    assert stats['basepaths']['/b']['throughput'] == 300
+
+
+def test_aggregate_without_transfers(tmpdir):
+    log = TransferLog(str(tmpdir.join('transfers.jsonl')))
+    stats = log.aggregate()
+    assert stats['transfers'] == 0
+    assert stats['throughput'] == 0
+    assert stats['users'] == {}
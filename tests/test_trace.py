@@ -0,0 +1,73 @@
+import os
+import runpy
+
+from lftp.ftp.trace import CommandTrace
+
+
+replay = runpy.run_path(os.path.join(os.path.dirname(__file__), '..',
+                                     'scripts', 'replay.py'))
+
+
+def record(session, cmd, arg='', time=0):
+    return dict(session=session, user='user', cmd=cmd, arg=arg, time=time)
+
+
+def test_password_not_recorded(tmpdir):
+    trace = CommandTrace(str(tmpdir.join('trace.jsonl')))
+    trace.record('s1', 'user', 'USER', 'user')
+    trace.record('s1', 'user', 'PASS', 'secret')
+    entries = [trace._queue.get(timeout=1) for _ in range(2)]
+    assert [e['arg'] for e in entries] == ['user', '']
+    assert all(e['session'] == 's1' for e in entries)
+
+
+def test_recorded_sessions_are_loaded(tmpdir):
+    path = str(tmpdir.join('trace.jsonl'))
+    trace = CommandTrace(path)
+    trace._flush([record('s2', 'LIST', time=3),
+                  record('s1', 'USER', 'user', time=1),
+                  record('s2', 'USER', 'user', time=2),
+                  record('s1', 'RETR', 'f.txt', time=4)])
+    sessions = replay['load_trace']([path])
+    assert [[r['cmd'] for r in records] for records in sessions] == [
+        ['USER', 'RETR'], ['USER', 'LIST']]
+
+
+def test_collect_paths_follows_working_directory():
+    dirs, files = replay['collect_paths']([[
+        record('s', 'CWD', '/docs'),
+        record('s', 'LIST', '-la'),
+        record('s', 'RETR', 'a/f.txt'),
+        record('s', 'CDUP'),
+        record('s', 'SIZE', 'g.txt'),
+    ]])
+    assert dirs == set(['/docs', '/docs/a'])
+    assert files == set(['/docs/a/f.txt', '/g.txt'])
+
+
+def test_collect_paths_creates_parents_of_created_paths():
+    dirs, files = replay['collect_paths']([[
+        record('s', 'STOR', '/incoming/day1/a.bin'),
+    ]])
+    assert dirs == set(['/incoming', '/incoming/day1'])
+    assert files == set()
+
+
+def test_collect_paths_skips_created_paths():
+    dirs, files = replay['collect_paths']([[
+        record('s', 'MKD', '/incoming/day1'),
+        record('s', 'STOR', '/incoming/day1/a.bin'),
+        record('s', 'RETR', '/incoming/day1/a.bin'),
+        record('s', 'CWD', '/incoming/day1'),
+    ]])
+    assert dirs == set(['/incoming'])
+    assert files == set()
+
+
+def test_percentile():
+    values = list(range(1, 101))
+    percentile = replay['percentile']
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile(values, 100) == 100
+    assert percentile([7], 90) == 7
@@ -0,0 +1,170 @@
+import os
+import time
+import errno
+import threading
+
+import mock
+import pytest
+
+from lftp.ftp import upload as mod
+from lftp.ftp.health import BasepathHealth
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def write(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def test_upload_published_when_complete(basepaths, make_fs):
+    fs = make_fs(basepaths)
+    f = fs.open('docs/new.txt', 'wb')
+    f.write(b'data')
+    assert not os.path.exists(f.name)
+    assert 'new.txt' not in fs.listdir('docs')
+    fs.publish_upload(f)
+    assert f.closed
+    assert read(f.name) == b'data'
+    assert not os.path.exists(f.part_path)
+
+
+def test_interrupted_upload_resumed(basepaths, make_fs):
+    fs = make_fs(basepaths)
+    f = fs.open('docs/new.txt', 'wb')
+    f.write(b'first')
+    f.close()
+    fs.abandon_upload(f.name)
+    assert not os.path.exists(f.name)
+    assert fs.getsize('docs/new.txt') == 5
+    f = fs.open('docs/new.txt', 'r+b')
+    f.seek(5)
+    f.write(b' second')
+    fs.publish_upload(f)
+    assert read(f.name) == b'first second'
+
+
+def test_seek_past_end_of_upload_fails(basepaths, make_fs):
+    fs = make_fs(basepaths)
+    write(os.path.join(basepaths[0], 'docs', 'f.txt'), b'x' * 1000)
+    f = fs.open('docs/f.txt', 'wb')
+    f.write(b'y' * 300)
+    f.close()
+    fs.abandon_upload(f.name)
+    assert fs.getsize('docs/f.txt') == 300
+    f = fs.open('docs/f.txt', 'r+b')
+    with pytest.raises(ValueError):
+        f.seek(1000)
+    f.seek(300)
+    assert f.tell() == 300
+    f.close()
+
+
+def test_append_keeps_complete_file_intact(basepaths, make_fs):
+    fs = make_fs(basepaths)
+    path = os.path.join(basepaths[0], 'docs', 'f.txt')
+    write(path, b'old')
+    f = fs.open('docs/f.txt', 'ab')
+    f.write(b' new')
+    assert read(path) == b'old'
+    fs.publish_upload(f)
+    assert read(path) == b'old new'
+
+
+def test_resume_missing_upload_fails(basepaths, make_fs):
+    fs = make_fs(basepaths)
+    with pytest.raises(OSError) as exc:
+        fs.open('docs/new.txt', 'r+b')
+    assert exc.value.errno == errno.ENOENT
+
+
+def test_concurrent_uploads_do_not_share_temporary_file(basepaths, make_fs):
+    first = make_fs(basepaths)
+    second = type(first)('/', None)
+    f1 = first.open('docs/new.txt', 'wb')
+    f1.write(b'first')
+    f2 = second.open('docs/new.txt', 'wb')
+    f2.write(b'second')
+    assert f1.part_path != f2.part_path
+    first.publish_upload(f1)
+    assert read(f1.name) == b'first'
+    second.publish_upload(f2)
+    assert read(f2.name) == b'second'
+
+
+def test_resuming_upload_in_progress_fails(basepaths, make_fs):
+    first = make_fs(basepaths)
+    second = type(first)('/', None)
+    f1 = first.open('docs/new.txt', 'wb')
+    f1.write(b'first')
+    with pytest.raises(OSError) as exc:
+        second.open('docs/new.txt', 'ab')
+    assert exc.value.errno == errno.EBUSY
+    first.publish_upload(f1)
+    assert read(f1.name) == b'first'
+
+
+def test_open_part_does_not_reuse_published_file(tmpdir):
+    path = str(tmpdir.join('.f.lftp-part'))
+    final = str(tmpdir.join('f'))
+    f = mod.open_part(path, 'wb')
+    f.write(b'data')
+    f.flush()
+    os.rename(path, final)
+    f.close()
+    f = mod.open_part(path, 'wb')
+    f.close()
+    assert read(final) == b'data'
+
+
+def test_cleaner_removes_expired_parts_only(basepaths):
+    docs = os.path.join(basepaths[0], 'docs')
+    expired = os.path.join(docs, '.old.lftp-part')
+    recent = os.path.join(docs, '.new.lftp-part')
+    locked = os.path.join(docs, '.busy.lftp-part')
+    other = os.path.join(docs, 'file.txt')
+    for path in (expired, recent, locked, other):
+        write(path, b'data')
+    old = time.time() - 3600
+    for path in (expired, locked, other):
+        os.utime(path, (old, old))
+    upload = mod.open_part(locked, 'ab')
+    try:
+        mod.PartCleaner(basepaths, max_age=60).clean()
+    finally:
+        upload.close()
+    assert not os.path.exists(expired)
+    assert os.path.exists(recent)
+    assert os.path.exists(locked)
+    assert os.path.exists(other)
+
+
+def test_cleaner_skips_hanging_basepath(basepaths):
+    health = BasepathHealth(basepaths, timeout=0.2, cooldown=30)
+    release = threading.Event()
+    old = time.time() - 3600
+    paths = []
+    for basepath in basepaths:
+        path = mod.part_path(os.path.join(basepath, 'docs', 'f.txt'))
+        write(path, b'data')
+        os.utime(path, (old, old))
+        paths.append(path)
+
+    def hang(*args):
+        release.wait()
+
+    def run(index, func, *args):
+        if index == 0 and func is next:
+            func = hang
+        return BasepathHealth.run(health, index, func, *args)
+
+    start = time.time()
+    with mock.patch.object(health, 'run', side_effect=run):
+        mod.PartCleaner(basepaths, max_age=60, health=health).clean()
+    release.set()
+    assert time.time() - start < 1
+    assert os.path.exists(paths[0])
+    assert not os.path.exists(paths[1])